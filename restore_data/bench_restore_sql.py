@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# ****************************************************************#
+# ScriptName: bench_restore_sql
+# Function: throughput of the SQL splitter on a mysqldump style data file,
+#           and optionally of loading it with the mysql cli against pymysql
+# ***************************************************************#
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import restore_from_downloads_aliyun as restore
+
+BENCH_DB = "restore_bench"
+CREATE_TABLE_SQL = ("CREATE TABLE `t` (`id` bigint NOT NULL, `name` varchar(64), `note` text, `price` decimal(10,2), "
+                    "`created` datetime, `flags` int, PRIMARY KEY (`id`)) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4")
+HEADER = ("-- MySQL dump 10.13\n--\n-- Host: localhost    Database: " + BENCH_DB + "\n"
+          "-- ------------------------------------------------------\n"
+          "/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;\n"
+          "/*!40101 SET NAMES utf8mb4 */;\n"
+          "/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n\n"
+          # both loaders import data files without selecting a database
+          "USE `" + BENCH_DB + "`;\n"
+          "LOCK TABLES `t` WRITE;\n")
+FOOTER = "UNLOCK TABLES;\n/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;\n\n-- Dump completed\n"
+WORDS = ["alpha", "beta", "gamma", "订单", "用户", "it\\'s", "a;b", "say \\\"hi\\\"", "C:\\\\tmp", "--x", "/*y*/"]
+
+
+def write_dump(path, size, statement_bytes):
+    """extended INSERTs of about statement_bytes each, like mysqldump --extended-insert writes them"""
+    rand = random.Random(1)
+    row_id = 0
+    with open(path, "w", encoding="utf-8") as out_file:
+        out_file.write(HEADER)
+        written = len(HEADER)
+        while written < size:
+            rows = []
+            length = 0
+            while length < statement_bytes:
+                row_id += 1
+                note = "NULL" if rand.random() < 0.2 else \
+                    "'" + " ".join(rand.choice(WORDS) for _ in range(rand.randint(1, 12))) + "'"
+                row = "(%d,'%s',%s,%d.%02d,'2024-%02d-%02d 12:%02d:00',%d)" % (
+                    row_id, rand.choice(WORDS), note, rand.randint(0, 99999), rand.randint(0, 99),
+                    rand.randint(1, 12), rand.randint(1, 28), rand.randint(0, 59), rand.randint(0, 1 << 30))
+                rows.append(row)
+                length += len(row) + 1
+            statement = "INSERT INTO `t` VALUES " + ",".join(rows) + ";\n"
+            out_file.write(statement)
+            written += len(statement.encode("utf-8"))
+        out_file.write(FOOTER)
+
+
+def measure(name, size, action):
+    started = time.time()
+    count = action()
+    elapsed = time.time() - started
+    print("[INFO]: %-28s %8.2fs %8.1f MB/s %10d" % (name, elapsed, size / elapsed / 1e6, count))
+    return elapsed
+
+
+def read_chunks(path):
+    count = 0
+    with open(path, "rb") as in_file:
+        while in_file.read(restore.SQL_READ_CHUNK):
+            count += 1
+    return count
+
+
+def count_items(iterator):
+    return sum(1 for _ in iterator)
+
+
+def prepare_database(executor):
+    executor.execute("DROP DATABASE IF EXISTS `" + BENCH_DB + "`")
+    executor.execute("CREATE DATABASE `" + BENCH_DB + "`")
+    executor.execute(CREATE_TABLE_SQL, BENCH_DB)
+
+
+def bench_load(path, size, args):
+    restore.db_host, restore.db_port, restore.db_user, restore.db_pass = args.host, args.port, args.user, args.password
+    restore.session_settings = list(restore.LOAD_PROFILE)
+    executors = [restore.CliExecutor()]
+    try:
+        executors.append(restore.PyMySQLExecutor(args.host, args.port, args.user, args.password))
+    except ImportError:
+        print("[WARN] pymysql is not installed, only the mysql cli is measured")
+    for executor in executors:
+        prepare_database(executor)
+        measure("load with " + executor.name, size, lambda: executor.import_sql(path) or 1)
+        executor.close()
+    restore.CliExecutor().execute("DROP DATABASE `" + BENCH_DB + "`")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="measure the SQL splitter of the restore script, and with --host "
+                                                 "compare loading the same dump with the mysql cli and pymysql")
+    parser.add_argument("--size-mb", type=int, default=256, help="size of the generated dump, default 256")
+    parser.add_argument("--statement-kb", type=int, default=1024,
+                        help="size of one extended INSERT, mysqldump writes up to net_buffer_length, default 1024")
+    parser.add_argument("--host", help="MySQL server to load into, database " + BENCH_DB + " is dropped and created")
+    parser.add_argument("--port", default="3306")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    args = parser.parse_args()
+
+    handle, path = tempfile.mkstemp(suffix=".sql")
+    os.close(handle)
+    try:
+        write_dump(path, args.size_mb * 1024 * 1024, args.statement_kb * 1024)
+        size = os.path.getsize(path)
+        print("[INFO]: generated dump " + restore.format_size(size) + " at " + path)
+        print("[INFO]: %-28s %9s %13s %10s" % ("", "time", "throughput", "items"))
+        measure("read only", size, lambda: read_chunks(path))
+        measure("split statements", size, lambda: count_items(restore.iter_sql_statements(path)))
+        measure("split batches", size, lambda: count_items(restore.iter_sql_batches(path, restore.SQL_BATCH_BYTES)))
+        if args.host:
+            bench_load(path, size, args)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,30 +5,89 @@
 # Function:
 # ***************************************************************#
 
+import argparse
+import json
 import os
+import re
+import shlex
 import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from subprocess import CalledProcessError, check_output
 
 STRUCTURE_FILE_NAME = "structure.sql"
 DATA_PATH_PREFIX = "data"
+JOURNAL_FILE_NAME = "restore_journal.jsonl"
+DEFAULT_WORKERS = 8
+# protocol command that resets the session state but keeps the connection, MySQL 5.7.3 and later
+COM_RESET_CONNECTION = 0x1f
+# upper bound of one multi-statement batch sent over the driver, also capped by max_allowed_packet
+SQL_BATCH_BYTES = 16 * 1024 * 1024
+SQL_READ_CHUNK = 4 * 1024 * 1024
+# SQL data files run in explicit transactions committed about every this many bytes
+SQL_TRANSACTION_BYTES = 256 * 1024 * 1024
+
+# session variables of every loader session. tables load in parallel in any order, so parent rows
+# may arrive after child rows; unique checks stay on so duplicate rows are still detected
+LOAD_PROFILE = [
+    ("foreign_key_checks", "0"),
+]
+# the settings of LOAD_PROFILE the server accepted, see apply_load_profile
+session_settings = []
+
+# one table's data: files are loaded in order by a single worker, tables run in parallel
+TableJob = namedtuple("TableJob", ["db", "table", "files", "files_format", "with_header", "total_size"])
+
+print_lock = threading.Lock()
+
+
+class RestoreError(Exception):
+    pass
+
+
+class ClientDelimiterError(RestoreError):
+    """a SQL file uses DELIMITER, a command of the mysql client; offset is where that statement starts"""
+
+    def __init__(self, sql_file, offset):
+        RestoreError.__init__(self, sql_file + " uses DELIMITER at byte " + str(offset))
+        self.offset = offset
+
+
+def log(message):
+    with print_lock:
+        print(message)
+        sys.stdout.flush()
+
+
+def mysql_client(*extra_settings):
+    settings = session_settings + list(extra_settings)
+    if not settings:
+        return "mysql"
+    return "mysql --init-command=" + shlex.quote("SET SESSION " + ", ".join(
+        name + "=" + value for name, value in settings))
+
+
+def run_command(cmd):
+    if os.system(cmd) != 0:
+        raise RestoreError("execute SQL failed. command: " + cmd)
 
 
 def create_database(db_host, db_port, db_user, db_pass, create_stmt_file):
-    cmd = "mysql -h" + db_host + " -P" + db_port + " -u" + \
+    cmd = mysql_client() + " -h" + db_host + " -P" + db_port + " -u" + \
         db_user + " -p" + db_pass + " <" + create_stmt_file
-    if os.system(cmd) != 0:
-        print("[ERROR]: execute SQL failed. command: " + cmd)
-        exit(1)
+    run_command(cmd)
 
 
 def create_table(db_host, db_port, db_user, db_pass, db_name, create_stmt_file):
-    cmd = "mysql -h" + db_host + " -P" + db_port + " -u" + db_user + \
+    cmd = mysql_client() + " -h" + db_host + " -P" + db_port + " -u" + db_user + \
         " -p" + db_pass + " -D" + db_name + " <" + create_stmt_file
-    if os.system(cmd) != 0:
-        print("[ERROR]: execute SQL failed. command: " + cmd)
-        exit(1)
+    run_command(cmd)
 
 
-def import_file_csv_with_header(db_host, db_port, db_user, db_pass, csv_file, db, table, with_header=False):
+def build_load_data_sql(csv_file, db, table, with_header=False):
     if with_header:
         in_file = open(csv_file)
         schema = in_file.readline().strip('\n')
@@ -37,141 +96,920 @@ def import_file_csv_with_header(db_host, db_port, db_user, db_pass, csv_file, db
         in_file.close()
     else:
         load_cmd = "load data local infile \"" + csv_file + "\" into table `" + db + "`.`" + table + "` character set utf8mb4 FIELDS TERMINATED BY \",\" enclosed by \"\\\"\""
-    
-    cmd = "mysql --local_infile=1 -h" + db_host + " -P" + db_port + " -u" + \
+    return load_cmd
+
+
+def import_file_csv_with_header(db_host, db_port, db_user, db_pass, csv_file, db, table, with_header=False):
+    load_cmd = build_load_data_sql(csv_file, db, table, with_header)
+    cmd = mysql_client() + " --local_infile=1 -h" + db_host + " -P" + db_port + " -u" + \
         db_user + " -p" + db_pass + " -e '" + load_cmd + "'"
 
-    print("[INFO]: trying to exec: " + cmd)
-    if os.system(cmd) != 0:
-        print("[ERROR]: execute SQL failed. command: " + cmd)
-        exit(1)
+    log("[INFO]: trying to exec: " + cmd)
+    run_command(cmd)
 
 
-def import_file_sql(db_host, db_port, db_user, db_pass, sql_file):
-    cmd = "mysql -h" + db_host + " -P" + db_port + \
-        " -u" + db_user + " -p" + db_pass + " <" + sql_file
-    print("[INFO]: trying to exec: " + cmd)
-    if os.system(cmd) != 0:
-        print("[ERROR]: execute SQL failed. command: " + cmd)
-        exit(1)
+def import_file_sql(db_host, db_port, db_user, db_pass, sql_file, offset=0):
+    # one transaction for the whole file; the COMMIT goes on its own line so a trailing
+    # "-- comment" without a newline can not swallow it, the ';' ends a last statement without one.
+    # with offset only the rest of the file from that byte on is imported
+    source = "cat " + sql_file if offset == 0 else "tail -c +" + str(offset + 1) + " " + sql_file
+    cmd = "{ " + source + "; echo; echo ';COMMIT;'; } | " + mysql_client(("autocommit", "0")) + " -h" + db_host + \
+        " -P" + db_port + " -u" + db_user + " -p" + db_pass
+    log("[INFO]: trying to exec: " + cmd)
+    run_command(cmd)
+
+
+# a run of text, complete quoted strings and comments, a ';' (group 1), or the opening of an unfinished quote or
+# comment (group 2). a run stops before a '-' or '/' that may open a comment in the next chunk, and after
+# SQL_RUN_TOKENS parts: the bound keeps the regex engine's backtracking stack small on multi-MB statements
+# while the loop over the matches still runs once per few hundred values instead of once per quoted string
+SQL_RUN_TOKENS = 256
+SQL_TOKEN = re.compile(rb"""(?:[^'"`#/;-]+|'[^'\\]*(?:\\.[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*"|`[^`]*`|/\*.*?\*/"""
+                       rb"""|#[^\n]*\n|--(?=\s)[^\n]*\n|/(?=[^*])|-(?=[^-]|-\S)){1,%d}"""
+                       rb"""|(;)|(['"`#]|/\*|--(?=\s))""" % SQL_RUN_TOKENS, re.S)
+SQL_ONLY_COMMENTS = re.compile(rb"(?:\s+|--(?=\s)[^\n]*(?:\n|$)|#[^\n]*(?:\n|$)|/\*(?!!).*?\*/)*", re.S)
+# mysql client command, only the CLI understands it
+SQL_DELIMITER = re.compile(rb"^[ \t]*delimiter[ \t]", re.M | re.I)
+SQL_DELIMITER_STATEMENT = re.compile(rb"delimiter[ \t]", re.I)
+
+
+def uses_client_delimiter(sql_file):
+    with open(sql_file, "rb") as in_file:
+        tail = b""
+        while True:
+            chunk = in_file.read(SQL_READ_CHUNK)
+            if not chunk:
+                return False
+            # keep the last line, it may continue in the next chunk
+            buf = tail + chunk
+            if SQL_DELIMITER.search(buf):
+                return True
+            tail = buf[buf.rfind(b"\n") + 1:][-64:]
+
+
+def iter_sql_statements(sql_file):
+    """split a SQL file on ';' outside quotes and comments, reading it in chunks"""
+    return iter_sql_batches(sql_file, 0)
+
+
+def iter_sql_batches(sql_file, max_bytes):
+    """yield runs of consecutive statements of up to max_bytes, each one slice of the file; 0 yields every statement alone
+
+    statements with nothing but comments are left out. raise ClientDelimiterError at a statement that starts
+    with DELIMITER, the statements before it were yielded.
+    """
+    # the pending batch moves along with every refill of the buffer, reading at least a batch at a time bounds that copying
+    chunk_size = max(SQL_READ_CHUNK, max_bytes)
+    with open(sql_file, "rb") as in_file:
+        buf = in_file.read(chunk_size)
+        # file offset of buf[0]; buf[batch:start] is the pending batch, the current statement starts at start
+        offset = 0
+        batch = start = pos = 0
+        while True:
+            match = None
+            for match in SQL_TOKEN.finditer(buf, pos):
+                kind = match.lastindex
+                if kind is None:
+                    continue
+                if kind == 2:
+                    # unfinished quote or comment, rescan it once the next chunk is read
+                    pos = match.start()
+                    break
+                end = match.end()
+                head = SQL_ONLY_COMMENTS.match(buf, start, end - 1).end()
+                if head == end - 1 or SQL_DELIMITER_STATEMENT.match(buf, head):
+                    # the server rejects an empty query
+                    if start > batch:
+                        yield buf[batch:start]
+                    if head != end - 1:
+                        raise ClientDelimiterError(sql_file, offset + start)
+                    batch = end
+                elif end - batch > max_bytes:
+                    if start > batch:
+                        yield buf[batch:start]
+                        batch = start
+                    if end - batch > max_bytes:
+                        yield buf[batch:end]
+                        batch = end
+                start = end
+            else:
+                # a trailing '-' or '/' may start a comment
+                if match is not None:
+                    pos = match.end()
+                pos = max(pos, len(buf) - 2)
+            more = in_file.read(chunk_size)
+            if not more:
+                head = SQL_ONLY_COMMENTS.match(buf, start).end()
+                if head < len(buf) and SQL_DELIMITER_STATEMENT.match(buf, head):
+                    if start > batch:
+                        yield buf[batch:start]
+                    raise ClientDelimiterError(sql_file, offset + start)
+                if start > batch and (head == len(buf) or len(buf) - batch > max_bytes):
+                    yield buf[batch:start]
+                    batch = start
+                if head < len(buf):
+                    yield buf[batch:]
+                return
+            buf = buf[batch:] + more
+            offset += batch
+            pos -= batch
+            start -= batch
+            batch = 0
+
+
+CREATE_TABLE = re.compile(r"CREATE\s+TABLE\b", re.I)
+# non-unique secondary indexes; PRIMARY and UNIQUE keys stay so duplicate rows are still detected while loading
+SECONDARY_INDEX = re.compile(r"(?:(?:FULLTEXT|SPATIAL)\s+(?:KEY|INDEX)|FULLTEXT|KEY|INDEX)\b", re.I)
+FULLTEXT_INDEX = re.compile(r"FULLTEXT\b", re.I)
+FOREIGN_KEY = re.compile(r"(?:CONSTRAINT\b[^(]*?)?FOREIGN\s+KEY\b", re.I)
+AUTO_INCREMENT = re.compile(r"\bAUTO_INCREMENT\b", re.I)
+FIRST_NAME = re.compile(r"`((?:[^`]|``)*)`|(\w+)")
+KEY_NAME = re.compile(r"(?:CONSTRAINT|(?:FULLTEXT|SPATIAL)\s+(?:KEY|INDEX)|FULLTEXT|SPATIAL|KEY|INDEX)\s*"
+                      r"(?:`((?:[^`]|``)*)`|(?!FOREIGN\b)(\w+))?", re.I)
+
+
+def split_definitions(body):
+    """split the text after the '(' of CREATE TABLE on top level commas, return (definitions, offset of ')')"""
+    definitions = []
+    depth = start = 0
+    quote = None
+    index = 0
+    while index < len(body):
+        char = body[index]
+        if quote is not None:
+            if char == "\\" and quote != "`":
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            if depth == 0:
+                definitions.append(body[start:index])
+                return definitions, index
+            depth -= 1
+        elif char == "," and depth == 0:
+            definitions.append(body[start:index])
+            start = index + 1
+        index += 1
+    return None
+
+
+def first_name(text):
+    match = FIRST_NAME.search(text)
+    if match is None:
+        return None
+    return match.group(1) if match.group(1) is not None else match.group(2)
+
+
+def key_name(definition):
+    """name of an index or a CONSTRAINT definition, None when it has none"""
+    match = KEY_NAME.match(definition)
+    if match is None:
+        return None
+    if match.group(1) is not None:
+        return match.group(1).replace("``", "`")
+    return match.group(2)
+
+
+def sql_string(value):
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def strip_deferred_keys(statement, defer_indexes, defer_foreign_keys):
+    """remove secondary indexes and/or foreign keys from a CREATE TABLE statement
+
+    return (statement, indexes, foreign_keys), the removed definitions can be re-added with ALTER TABLE ... ADD.
+    """
+    open_paren = statement.find("(")
+    parsed = split_definitions(statement[open_paren + 1:]) if open_paren >= 0 else None
+    if parsed is None:
+        return statement, [], []
+    definitions, close_paren = parsed
+    definitions = [definition.strip() for definition in definitions]
+    # the AUTO_INCREMENT column must lead some index at CREATE TABLE time, keep the index it leads
+    auto_columns = set(first_name(definition) for definition in definitions
+                       if definition[:1] == "`" and AUTO_INCREMENT.search(definition))
+    kept, indexes, foreign_keys = [], [], []
+    for definition in definitions:
+        if defer_indexes and SECONDARY_INDEX.match(definition):
+            paren = definition.find("(")
+            if first_name(definition[paren + 1:]) not in auto_columns:
+                indexes.append(definition)
+                continue
+        elif defer_foreign_keys and FOREIGN_KEY.match(definition):
+            foreign_keys.append(definition)
+            continue
+        kept.append(definition)
+    if not indexes and not foreign_keys:
+        return statement, [], []
+    statement = statement[:open_paren + 1] + "\n  " + ",\n  ".join(kept) + "\n" + \
+        statement[open_paren + 1 + close_paren:]
+    return statement, indexes, foreign_keys
+
+
+def prepare_table_structure(structure_file, defer_indexes, defer_foreign_keys):
+    """return (file to execute, indexes, foreign_keys); the file is a temporary copy when keys were removed"""
+    if uses_client_delimiter(structure_file):
+        return structure_file, [], []
+    statements = []
+    indexes, foreign_keys = [], []
+    for statement in iter_sql_statements(structure_file):
+        try:
+            text = statement.decode("utf-8")
+        except UnicodeDecodeError:
+            return structure_file, [], []
+        head = SQL_ONLY_COMMENTS.match(statement).end()
+        if CREATE_TABLE.match(text, len(statement[:head].decode("utf-8"))):
+            text, statement_indexes, statement_foreign_keys = strip_deferred_keys(
+                text, defer_indexes, defer_foreign_keys)
+            indexes += statement_indexes
+            foreign_keys += statement_foreign_keys
+        statements.append(text)
+    if not indexes and not foreign_keys:
+        return structure_file, [], []
+    out_file = tempfile.NamedTemporaryFile("w", suffix=".sql", delete=False, encoding="utf-8")
+    with out_file:
+        out_file.write("".join(statements) + "\n")
+    return out_file.name, indexes, foreign_keys
+
+
+class CliExecutor(object):
+    """one mysql client process per file"""
+    name = "mysql cli"
+
+    def create_database(self, create_stmt_file):
+        create_database(db_host, db_port, db_user, db_pass, create_stmt_file)
+
+    def create_table(self, db_name, create_stmt_file):
+        create_table(db_host, db_port, db_user, db_pass, db_name, create_stmt_file)
+
+    def import_csv(self, csv_file, db, table, with_header):
+        import_file_csv_with_header(db_host, db_port, db_user, db_pass, csv_file, db, table, with_header)
+
+    def import_sql(self, sql_file):
+        import_file_sql(db_host, db_port, db_user, db_pass, sql_file)
+
+    def execute(self, sql, db_name=None):
+        cmd = mysql_client() + " -h" + db_host + " -P" + db_port + " -u" + db_user + " -p" + db_pass
+        if db_name is not None:
+            cmd += " -D" + db_name
+        run_command(cmd + " -e " + shlex.quote(sql))
+
+    def select_value(self, sql):
+        cmd = "mysql -h" + db_host + " -P" + db_port + " -u" + db_user + " -p" + db_pass + " -N -e " + shlex.quote(sql)
+        try:
+            return check_output(cmd, shell=True).decode().strip()
+        except CalledProcessError:
+            raise RestoreError("execute SQL failed. command: " + cmd)
+
+    def close(self):
+        pass
+
+
+class PyMySQLExecutor(object):
+    """one reusable pymysql connection per worker thread, files run over it without spawning mysql"""
+    name = "pymysql"
+
+    def __init__(self, host, port, user, password):
+        import pymysql
+        self.pymysql = pymysql
+        self.connect_args = dict(host=host, port=int(port), user=user, password=password,
+                                 charset="utf8mb4", autocommit=True, local_infile=True,
+                                 client_flag=pymysql.constants.CLIENT.MULTI_STATEMENTS)
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.fallback = CliExecutor()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.pymysql.connect(**self.connect_args)
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+            self.apply_session_settings(conn)
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT @@max_allowed_packet")
+                max_packet = int(cursor.fetchone()[0])
+            self.local.batch_bytes = max(1024 * 1024, min(SQL_BATCH_BYTES, max_packet - 64 * 1024))
+        return conn
+
+    def apply_session_settings(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute("SET NAMES " + self.connect_args["charset"])
+            if session_settings:
+                cursor.execute("SET SESSION " + ", ".join(name + "=" + value for name, value in session_settings))
+        conn.autocommit(self.connect_args["autocommit"])
+
+    def reset(self):
+        """clear what the last file left in the session of this worker: USE, SET NAMES, SET SESSION, user variables
+
+        COM_RESET_CONNECTION keeps the connection open; when the server lacks it (before MySQL 5.7.3)
+        or the connection is lost, the next file on this worker connects again.
+        """
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            return
+        try:
+            conn._execute_command(COM_RESET_CONNECTION, b"")
+            conn._read_ok_packet()
+            self.apply_session_settings(conn)
+        except self.pymysql.MySQLError:
+            self.local.conn = None
+            with self.connections_lock:
+                self.connections.remove(conn)
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def run(self, action, description):
+        try:
+            return action(self.connection())
+        except self.pymysql.MySQLError as e:
+            raise RestoreError("execute SQL failed. " + description + ": " + str(e))
+        finally:
+            # after every file and every error, so the next file on this worker starts from a clean session
+            self.reset()
+
+    def execute_file(self, conn, sql_file, transaction=False):
+        with conn.cursor() as cursor:
+            if transaction:
+                conn.begin()
+            pending = 0
+            try:
+                for batch in iter_sql_batches(sql_file, self.local.batch_bytes):
+                    cursor.execute(batch)
+                    while cursor.nextset():
+                        pass
+                    pending += len(batch)
+                    if transaction and pending >= SQL_TRANSACTION_BYTES:
+                        conn.commit()
+                        conn.begin()
+                        pending = 0
+                if transaction:
+                    conn.commit()
+            except self.pymysql.MySQLError:
+                if transaction and conn.open:
+                    conn.rollback()
+                raise
+            except ClientDelimiterError:
+                # keep what ran before the DELIMITER, the mysql cli continues from there
+                if transaction:
+                    conn.commit()
+                raise
+
+    def execute_sql_file(self, sql_file, db_name=None, transaction=False):
+        def action(conn):
+            if db_name is not None:
+                conn.select_db(db_name)
+            self.execute_file(conn, sql_file, transaction)
+        self.run(action, "file: " + sql_file)
+
+    def execute_structure_file(self, sql_file, db_name=None):
+        # structure files are small, check them before running anything so a DELIMITER file runs whole in the cli
+        if uses_client_delimiter(sql_file):
+            log("[INFO]: " + sql_file + " uses DELIMITER, run it with mysql cli")
+            if db_name is not None:
+                self.fallback.create_table(db_name, sql_file)
+            else:
+                self.fallback.create_database(sql_file)
+            return
+        self.execute_sql_file(sql_file, db_name)
+
+    def create_database(self, create_stmt_file):
+        self.execute_structure_file(create_stmt_file)
+
+    def create_table(self, db_name, create_stmt_file):
+        self.execute_structure_file(create_stmt_file, db_name)
+
+    def import_csv(self, csv_file, db, table, with_header):
+        load_sql = build_load_data_sql(csv_file, db, table, with_header)
+
+        def action(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(load_sql)
+        self.run(action, "load data: " + csv_file)
+
+    def import_sql(self, sql_file):
+        # data files can be many GB and never use DELIMITER, they are checked while they stream instead of read twice
+        try:
+            self.execute_sql_file(sql_file, transaction=True)
+        except ClientDelimiterError as e:
+            log("[INFO]: " + sql_file + " uses DELIMITER, run it from byte " + str(e.offset) + " with mysql cli")
+            import_file_sql(db_host, db_port, db_user, db_pass, sql_file, e.offset)
+
+    def execute(self, sql, db_name=None):
+        def action(conn):
+            if db_name is not None:
+                conn.select_db(db_name)
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+        self.run(action, sql)
+
+    def select_value(self, sql):
+        def action(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                return str(cursor.fetchone()[0])
+        return self.run(action, sql)
+
+    def close(self):
+        with self.connections_lock:
+            for conn in self.connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self.connections = []
+        self.local = threading.local()
+
+
+def create_executor(driver):
+    if driver in ("auto", "pymysql"):
+        try:
+            return PyMySQLExecutor(db_host, db_port, db_user, db_pass)
+        except ImportError:
+            if driver == "pymysql":
+                raise
+            print("[WARN]: pymysql is not installed (pip install pymysql), fall back to mysql cli")
+    return CliExecutor()
+
+
+class RestoreJournal(object):
+    """append-only JSONL log of finished structure and data files, read back by --resume
+
+    every line is one event; a file counts as done only while its size and mtime still match.
+    with path None nothing is recorded and every file counts as not done.
+    """
+
+    def __init__(self, path, root_dir, target, resume):
+        self.path = path
+        self.root_dir = root_dir
+        self.lock = threading.Lock()
+        self.done = {}
+        self.finished_tables = set()
+        self.started_tables = set()
+        # (db, table) -> {"indexes": [...], "foreign_keys": [...]} removed from CREATE TABLE and not added back yet
+        self.deferred = {}
+        # tables whose keys an earlier run deferred, it may have added some of them without recording it
+        self.earlier_deferred = set()
+        self.out = None
+        if path is None:
+            return
+        if resume and not os.path.exists(path):
+            print("[WARN] no journal at " + path + ", restore from the beginning")
+            resume = False
+        if resume:
+            complete_line = self.load(target)
+            self.out = open(path, "a")
+            if not complete_line:
+                self.out.write("\n")
+        else:
+            self.out = open(path, "w")
+            self.append({"event": "begin", "root": root_dir, "target": target})
+
+    def load(self, target):
+        """replay the journal, return whether it ends with a complete line"""
+        line = "\n"
+        with open(self.path) as in_file:
+            for line in in_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be cut off by a crash
+                    continue
+                event = record.get("event")
+                if event == "begin":
+                    if record["root"] != self.root_dir or record["target"] != target:
+                        raise RestoreError("journal " + self.path + " belongs to a restore of " + record["root"] +
+                                           " to " + record["target"] + ", use another --journal")
+                elif event == "file":
+                    self.done[record["path"]] = record["stat"]
+                elif event == "table_start":
+                    # a table that starts again was truncated, its earlier files no longer count
+                    prefix = record["dir"] + os.sep
+                    for path in [path for path in self.done if path.startswith(prefix)]:
+                        del self.done[path]
+                    self.finished_tables.discard(record["table"])
+                    self.started_tables.add(record["table"])
+                elif event == "table_done":
+                    self.finished_tables.add(record["table"])
+                elif event == "keys_deferred":
+                    self.deferred.setdefault((record["db"], record["table"]), {})[record["kind"]] = record["keys"]
+                    self.earlier_deferred.add((record["db"], record["table"]))
+                elif event == "keys_added":
+                    self.forget_keys(record["db"], record["table"], record["kind"], record["keys"])
+        print("[INFO]: resume from " + self.path + ": " + str(len(self.done)) + " files and " +
+              str(len(self.finished_tables)) + " tables already restored")
+        return line.endswith("\n")
+
+    def append(self, record):
+        if self.out is None:
+            return
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.out.write(line)
+            self.out.flush()
+            os.fsync(self.out.fileno())
+
+    def relpath(self, path):
+        return os.path.relpath(path, self.root_dir)
+
+    @staticmethod
+    def file_stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_done(self, path):
+        # a missing file is not done, restoring it reports the error of that database or table
+        stat = self.file_stat(path)
+        return stat is not None and self.done.get(self.relpath(path)) == stat
+
+    def record_file(self, path):
+        self.append({"event": "file", "path": self.relpath(path), "stat": self.file_stat(path)})
+
+    def is_table_done(self, job):
+        return job.db + "." + job.table in self.finished_tables and all(self.is_done(path) for path in job.files)
+
+    def was_table_started(self, job):
+        return job.db + "." + job.table in self.started_tables
+
+    def record_table(self, job, event):
+        self.append({"event": event, "table": job.db + "." + job.table,
+                     "dir": self.relpath(os.path.dirname(job.files[0]))})
+
+    def record_deferred_keys(self, db, table, kind, keys):
+        self.deferred.setdefault((db, table), {})[kind] = list(keys)
+        self.append({"event": "keys_deferred", "db": db, "table": table, "kind": kind, "keys": keys})
+
+    def record_keys_added(self, db, table, kind, keys):
+        self.forget_keys(db, table, kind, keys)
+        self.append({"event": "keys_added", "db": db, "table": table, "kind": kind, "keys": keys})
+
+    def forget_keys(self, db, table, kind, keys):
+        pending = self.deferred.get((db, table), {}).get(kind, [])
+        pending[:] = [key for key in pending if key not in keys]
+
+    def pending_keys(self, db, table, kind):
+        return list(self.deferred.get((db, table), {}).get(kind, []))
+
+    def deferred_by_earlier_run(self, db, table):
+        return (db, table) in self.earlier_deferred
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+
+
+def natural_key(name):
+    # data_2.csv before data_10.csv
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def list_table_job(db_dir, table_dir, table_data_dir_path):
+    data_files = sorted(os.listdir(table_data_dir_path), key=natural_key)
+    if not data_files:
+        return None
+    filename_slices = data_files[0].split(".")
+    files_format = filename_slices[-1]
+    # .wh.csv is csv with header, .csv is csv without header
+    with_header = files_format == "csv" and len(filename_slices) > 1 and filename_slices[-2] == "wh"
+    files = []
+    total_size = 0
+    for data_file in data_files:
+        data_file_path = os.path.join(table_data_dir_path, data_file)
+        file_size = os.path.getsize(data_file_path)
+        if file_size > 0:
+            files.append(data_file_path)
+            total_size += file_size
+    return TableJob(db_dir, table_dir, files, files_format, with_header, total_size)
+
+
+def restore_structures(root_dir, failures, defer_indexes=False, defer_foreign_keys=False):
+    """create every database and table first, return the data jobs of tables whose structure succeeded
+
+    with defer_indexes/defer_foreign_keys, tables that have data are created without those keys,
+    the removed definitions are kept in the journal until they are added back.
+    """
+    jobs = []
+    for db_dir in sorted(os.listdir(root_dir)):
+        dir_path = os.path.join(root_dir, db_dir)
+        if not os.path.isdir(dir_path):
+            continue
+        db_structure_file = os.path.join(dir_path, STRUCTURE_FILE_NAME)
+        if journal.is_done(db_structure_file):
+            log("[INFO]: structure database: " + db_dir + " already restored, skip")
+        else:
+            try:
+                executor.create_database(db_structure_file)
+            except (RestoreError, IOError, OSError) as e:
+                failures[db_dir] = str(e)
+                log("[ERROR]: restore structure database: " + db_dir + " failed, skip its tables")
+                continue
+            journal.record_file(db_structure_file)
+            log("[INFO]: restore structure database: " + db_dir + " ends")
+
+        for table_dir in sorted(os.listdir(dir_path)):
+            table_dir_path = os.path.join(dir_path, table_dir)
+            if not os.path.isdir(table_dir_path):
+                continue
+            table_data_dir_path = os.path.join(table_dir_path, DATA_PATH_PREFIX)
+            job = None
+            if os.path.isdir(table_data_dir_path):
+                job = list_table_job(db_dir, table_dir, table_data_dir_path)
+            has_data = job is not None and len(job.files) > 0
+
+            table_structure_file = os.path.join(table_dir_path, STRUCTURE_FILE_NAME)
+            if journal.is_done(table_structure_file):
+                log("[INFO]: structure table: " + db_dir + "." + table_dir + " already restored, skip")
+            else:
+                try:
+                    create_table_deferring_keys(db_dir, table_dir, table_structure_file,
+                                                defer_indexes and has_data, defer_foreign_keys)
+                except (RestoreError, IOError, OSError) as e:
+                    failures[db_dir + "." + table_dir] = str(e)
+                    log("[ERROR]: restore structure table: " + db_dir + "." + table_dir + " failed")
+                    continue
+                journal.record_file(table_structure_file)
+                log("[INFO]: restore structure table: " + table_dir + " ends")
+
+            if has_data:
+                jobs.append(job)
+    return jobs
+
+
+def create_table_deferring_keys(db, table, structure_file, defer_indexes, defer_foreign_keys):
+    if not defer_indexes and not defer_foreign_keys:
+        executor.create_table(db, structure_file)
+        return
+    create_file, indexes, foreign_keys = prepare_table_structure(structure_file, defer_indexes, defer_foreign_keys)
+    try:
+        executor.create_table(db, create_file)
+    finally:
+        if create_file != structure_file:
+            os.remove(create_file)
+    for kind, keys in (("indexes", indexes), ("foreign_keys", foreign_keys)):
+        if keys:
+            journal.record_deferred_keys(db, table, kind, keys)
+            log("[INFO]: table " + db + "." + table + " created without " + str(len(keys)) + " " +
+                kind.replace("_", " ") + ", add them after loading")
+
+
+def add_deferred_keys(db, table, kind):
+    keys = journal.pending_keys(db, table, kind)
+    if keys and journal.deferred_by_earlier_run(db, table):
+        # the earlier run may have stopped after an ALTER TABLE but before recording it, adding those keys
+        # again fails with a duplicate key name (1061) or foreign key (1826)
+        existing = [key for key in keys if key_exists(db, table, kind, key_name(key))]
+        if existing:
+            log("[INFO]: " + str(len(existing)) + " " + kind.replace("_", " ") + " of table " + db + "." + table +
+                " were already added, skip them")
+            journal.record_keys_added(db, table, kind, existing)
+            keys = [key for key in keys if key not in existing]
+    if not keys:
+        return
+    name = db + "." + table
+    table_ref = "`" + db + "`.`" + table + "`"
+    # one ALTER TABLE builds all indexes in a single pass over the rows, but InnoDB adds FULLTEXT indexes one at a time
+    batches = [[key for key in keys if not FULLTEXT_INDEX.match(key)]]
+    batches += [[key] for key in keys if FULLTEXT_INDEX.match(key)]
+    started = time.time()
+    for batch in batches:
+        if batch:
+            # unqualified REFERENCES resolve against the table's own database
+            executor.execute("ALTER TABLE " + table_ref + " ADD " + ", ADD ".join(batch), db)
+            journal.record_keys_added(db, table, kind, batch)
+    log("[INFO]: add " + str(len(keys)) + " " + kind.replace("_", " ") + " to table " + name +
+        " ends (elapsed " + str(int(time.time() - started)) + "s)")
+
+
+def key_exists(db, table, kind, name):
+    if name is None:
+        return False
+    if kind == "foreign_keys":
+        sql = "SELECT COUNT(*) FROM information_schema.TABLE_CONSTRAINTS WHERE CONSTRAINT_TYPE = 'FOREIGN KEY' " \
+              "AND TABLE_SCHEMA = " + sql_string(db) + " AND TABLE_NAME = " + sql_string(table) + \
+              " AND CONSTRAINT_NAME = " + sql_string(name)
+    else:
+        sql = "SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = " + sql_string(db) + \
+              " AND TABLE_NAME = " + sql_string(table) + " AND INDEX_NAME = " + sql_string(name)
+    return executor.select_value(sql) != "0"
+
+
+def add_deferred_foreign_keys(workers, failures):
+    """foreign keys go last: the referenced tables must be loaded and have their indexes"""
+    tables = [(db, table) for db, table in sorted(journal.deferred)
+              if journal.pending_keys(db, table, "foreign_keys")
+              and db not in failures and db + "." + table not in failures]
+    if not tables:
+        return
+    log("[INFO]: adding foreign keys to " + str(len(tables)) + " tables")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(add_deferred_keys, db, table, "foreign_keys"): db + "." + table
+                   for db, table in tables}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures[name] = str(e)
+                log("[ERROR]: add foreign keys to table " + name + " failed: " + str(e))
+
+
+def restore_table_data(job):
+    name = job.db + "." + job.table
+    if journal.was_table_started(job):
+        # the last run stopped inside this table, or its data files changed since they were loaded
+        log("[WARN] table " + name + " is partly restored or its data files changed, truncate and load it again")
+        executor.execute("TRUNCATE TABLE `" + job.db + "`.`" + job.table + "`")
+    journal.record_table(job, "table_start")
+    for index, data_file_path in enumerate(job.files, 1):
+        if job.files_format == "csv":
+            executor.import_csv(data_file_path, job.db, job.table, job.with_header)
+        elif job.files_format == "sql":
+            executor.import_sql(data_file_path)
+        else:
+            raise RestoreError("unknown data file format: " + data_file_path)
+        journal.record_file(data_file_path)
+        log("[INFO]: restore data [" + str(index) + "/" + str(len(job.files)) + "] of table " + name)
+    journal.record_table(job, "table_done")
+
+
+def restore_table(job):
+    if not journal.is_table_done(job):
+        restore_table_data(job)
+    # built right after the table's own load, so index builds of different tables overlap
+    add_deferred_keys(job.db, job.table, "indexes")
+
+
+def restore_data(jobs, workers, failures):
+    finished = [job for job in jobs
+                if journal.is_table_done(job) and not journal.pending_keys(job.db, job.table, "indexes")]
+    if finished:
+        log("[INFO]: skip " + str(len(finished)) + " tables already restored")
+        jobs = [job for job in jobs if job not in finished]
+    # largest tables first so a huge table does not start last and stretch the total time
+    jobs = sorted(jobs, key=lambda job: job.total_size, reverse=True)
+    total_size = sum(job.total_size for job in jobs)
+    log("[INFO]: loading " + str(len(jobs)) + " tables (" + format_size(total_size) +
+        ") with " + str(workers) + " workers")
+    started = time.time()
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(restore_table, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            name = job.db + "." + job.table
+            done += 1
+            try:
+                future.result()
+            except Exception as e:
+                failures[name] = str(e)
+                log("[ERROR]: restore data of table " + name + " failed: " + str(e))
+                continue
+            log("[INFO]: restore data of table " + name + " ends (" + str(done) + "/" + str(len(jobs)) +
+                " tables, " + format_size(job.total_size) + ", elapsed " + str(int(time.time() - started)) + "s)")
+
+
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return "%.1f%s" % (size, unit) if unit != "B" else str(size) + unit
+        size /= 1024.0
 
 
 def print_usage():
     print(
-        "Usage: python ./restore_mysql.py [backupset_directory] [database_host] [database_port] [database_username] [database_password]")
+        "Usage: python ./restore_mysql.py [backupset_directory] [database_host] [database_port] [database_username] [database_password] [--workers N] [--driver auto|pymysql|cli] [--resume | --fresh] [--journal FILE] [--defer-indexes] [--defer-foreign-keys] [--no-binlog]")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(usage="python ./restore_mysql.py [backupset_directory] [database_host] "
+                                           "[database_port] [database_username] [database_password] [options]")
+    parser.add_argument("backupset_directory")
+    parser.add_argument("database_host")
+    parser.add_argument("database_port")
+    parser.add_argument("database_username")
+    parser.add_argument("database_password")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="tables loaded concurrently, default " + str(DEFAULT_WORKERS))
+    parser.add_argument("--driver", choices=["auto", "pymysql", "cli"], default="auto",
+                        help="auto uses pymysql when installed: one pooled connection per worker, "
+                             "no mysql process per file; cli runs the mysql client for every file")
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument("--resume", action="store_true",
+                       help="skip structures and tables finished by an earlier run according to the journal")
+    start.add_argument("--fresh", action="store_true",
+                       help="restore from the beginning and overwrite the journal of an earlier run")
+    parser.add_argument("--journal",
+                        help="progress journal, default " + JOURNAL_FILE_NAME + " in the current directory")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="create tables without their non-unique secondary and fulltext indexes "
+                             "and build them with one ALTER TABLE per table after its data is loaded")
+    parser.add_argument("--defer-foreign-keys", action="store_true",
+                        help="create tables without foreign keys and add them after all data is loaded")
+    parser.add_argument("--no-binlog", action="store_true",
+                        help="also SET sql_log_bin=0 for loader sessions where the account may; "
+                             "the restored rows then do not reach replicas")
+    return parser.parse_args()
+
+
+def apply_load_profile(no_binlog):
+    """keep the LOAD_PROFILE settings this account may set, every loader session applies them on connect
 
+    only session variables are changed, nothing server-wide, so an interrupted restore leaves no state behind.
+    """
+    global session_settings
+    profile = list(LOAD_PROFILE)
+    if no_binlog:
+        profile.append(("sql_log_bin", "0"))
+    permitted = []
+    for name, value in profile:
+        try:
+            executor.execute("SET SESSION " + name + "=" + value)
+        except RestoreError:
+            print("[WARN] can not set " + name + "=" + value + " for loader sessions, load without it")
+            continue
+        permitted.append((name, value))
+    session_settings = permitted
+    # connections opened by the probe do not have the profile yet
+    executor.close()
+    print("[INFO]: loader session settings: " +
+          (", ".join(name + "=" + value for name, value in permitted) or "none"))
 
-enable_foreign_key_check = None
 
-def read_db_foreign_key_enable():
-    global enable_foreign_key_check
-    cmd = "mysql -h" + db_host + " -P" + db_port + " -u" + db_user + " -p" + db_pass + " -e " + "'SELECT @@FOREIGN_KEY_CHECKS'" # + " | awk '{print $1}' | sed -n '2,1p' "
-    from subprocess import check_output
+def check_global_foreign_key_checks():
+    # earlier versions of this script turned FOREIGN_KEY_CHECKS off server-wide and could leave it off on a crash
     try:
-        cmd_output = check_output(cmd, shell=True)
-        cmd_output = cmd_output.decode()
-        foreign_check_enable = cmd_output.split("\n")[1]
-        if foreign_check_enable == "1":
-            print("[INFO]: foreign key check is on")
-            enable_foreign_key_check = True
-        elif foreign_check_enable == "0":
-            print("[INFO]: foreign key check is off")
-            enable_foreign_key_check = False
-    except Exception:
-        print("[WARN] try to get foreign key config failed. won't change foreign key config for MySQL")
-        # do nothing
-
-
-def do_disable_foreign_key_check():
-    global enable_foreign_key_check
-    if enable_foreign_key_check is True:
-        print("[INFO]: try to disable foreign key check before importing data...")
-        cmd = "mysql -h" + db_host + " -P" + db_port + " -u" + db_user + " -p" + db_pass + " -e " + "'SET GLOBAL FOREIGN_KEY_CHECKS=0'"
-        if os.system(cmd) != 0:
-            print("[ERROR]: execute SQL failed. command: " + cmd)
-            exit(1)
-        print("[INFO]: success disable foreign key check")
-    else:
-        print("[INFO]: no need to disable foreign key check before importing data")
-
-def do_enable_foreign_key_check():
-    global enable_foreign_key_check
-    if enable_foreign_key_check is True:
-        print("[INFO]: try to enable foreign key check after importing data...")
-        cmd = "mysql -h" + db_host + " -P" + db_port + " -u" + db_user + " -p" + db_pass + " -e " + "'SET GLOBAL FOREIGN_KEY_CHECKS=1'"
-        if os.system(cmd) != 0:
-            print("[ERROR]: execute SQL failed. command: " + cmd)
-            exit(1)
-        print("[INFO]: success enable foreign key check")
-    else:
-        print("[INFO]: no need to enable foreign key check after importing data")
+        global_value = executor.select_value("SELECT @@GLOBAL.FOREIGN_KEY_CHECKS")
+    except RestoreError:
+        print("[WARN] try to get foreign key config failed")
+        return
+    if global_value == "0":
+        print("[WARN] FOREIGN_KEY_CHECKS is off server-wide, maybe left by an interrupted restore. "
+              "if so turn it on again: SET GLOBAL FOREIGN_KEY_CHECKS=1")
+
 
 if __name__ == '__main__':
-    if len(sys.argv) != 6:
+    if len(sys.argv) < 6:
         print_usage()
         exit()
 
-    root_dir = os.path.abspath(sys.argv[1])
-    db_host = sys.argv[2]
-    db_port = sys.argv[3]
-    db_user = sys.argv[4]
-    db_pass = sys.argv[5]
+    args = parse_args()
+    root_dir = os.path.abspath(args.backupset_directory)
+    db_host = args.database_host
+    db_port = args.database_port
+    db_user = args.database_username
+    db_pass = args.database_password
     print("[INFO]: restore data from " + root_dir +
           " to " + db_host + ":" + db_port)
 
-    read_db_foreign_key_enable()
+    # not inside the backup set, which may be read-only
+    journal_path = os.path.abspath(args.journal or JOURNAL_FILE_NAME)
+    if not args.resume and not args.fresh and os.path.exists(journal_path):
+        # starting over would overwrite the only record of what the earlier run restored
+        print("[ERROR]: journal " + journal_path + " of an earlier run exists, "
+              "continue that run with --resume or start over with --fresh")
+        exit(1)
+    try:
+        journal = RestoreJournal(journal_path, root_dir, db_host + ":" + db_port, args.resume)
+    except (RestoreError, IOError, OSError) as e:
+        if args.resume:
+            print("[ERROR]: can not use journal " + journal_path + ": " + str(e))
+            exit(1)
+        print("[WARN] can not write journal " + journal_path + ": " + str(e) +
+              ", restore without it (--resume will not be possible)")
+        journal = RestoreJournal(None, root_dir, db_host + ":" + db_port, False)
 
-    do_disable_foreign_key_check()
+    executor = create_executor(args.driver)
+    print("[INFO]: execute SQL with " + executor.name)
+    check_global_foreign_key_checks()
+    apply_load_profile(args.no_binlog)
 
+    failures = {}
     try:
-        db_dirs = os.listdir(root_dir)
-        for db_dir in db_dirs:
-            dir_path = os.path.join(root_dir, db_dir)
-            if not os.path.isdir(dir_path):
-                continue
-            db_structure_file = os.path.join(dir_path, STRUCTURE_FILE_NAME)
-            create_database(db_host, db_port, db_user, db_pass, db_structure_file)
-            print("[INFO]: restore structure database: " + db_dir + " ends")
-
-            table_dirs = os.listdir(dir_path)
-            for table_dir in table_dirs:
-                table_dir_path = os.path.join(dir_path, table_dir)
-                if not os.path.isdir(table_dir_path):
-                    continue
-                table_structure_file = os.path.join(table_dir_path, STRUCTURE_FILE_NAME)
-                create_table(db_host, db_port, db_user, db_pass, db_dir, table_structure_file)
-                print("[INFO]: restore structure table: " + table_dir + " ends")
-
-                table_data_dir_path = os.path.join(table_dir_path, DATA_PATH_PREFIX)
-                if not os.path.isdir(table_data_dir_path):
-                    continue
-                
-                filename_slices = os.listdir(table_data_dir_path)[0].split(".")
-                files_format = filename_slices[-1]
-                if files_format == "csv":
-                    with_header = len(filename_slices) > 1 and filename_slices[-2]=="wh" # .wh.csv is csv with header, .csv is csv without header
-                    csv_files = os.listdir(table_data_dir_path)
-                    csv_count = 0
-                    for csv_file in csv_files:
-                        csv_file_path = os.path.join(table_data_dir_path, csv_file)
-                        file_size = os.path.getsize(csv_file_path)
-                        if file_size > 0:
-                            import_file_csv_with_header(db_host, db_port, db_user,
-                                            db_pass, csv_file_path, db_dir, table_dir, with_header)
-                            csv_count = csv_count + 1
-                            print("[INFO]: restore data [" + str(csv_count) + "/" + str(
-                                len(csv_files)) + "] of table " + db_dir + "." + table_dir)
-                elif files_format == "sql":
-                    sql_files = os.listdir(table_data_dir_path)
-                    sql_count = 0
-                    for sql_file in sql_files:
-                        sql_file_path = os.path.join(table_data_dir_path, sql_file)
-                        file_size = os.path.getsize(sql_file_path)
-                        if file_size > 0:
-                            import_file_sql(db_host, db_port,
-                                            db_user, db_pass, sql_file_path)
-                            sql_count = sql_count + 1
-                            print("[INFO]: restore data [" + str(sql_count) + "/" + str(
-                                len(sql_files)) + "] of table " + db_dir + "." + table_dir)
+        # all structures first, then table data in parallel
+        table_jobs = restore_structures(root_dir, failures, args.defer_indexes, args.defer_foreign_keys)
+        restore_data(table_jobs, max(1, args.workers), failures)
+        add_deferred_foreign_keys(max(1, args.workers), failures)
     finally:
-        do_enable_foreign_key_check()
+        executor.close()
+        journal.close()
+
+    if failures:
+        print("[ERROR]: " + str(len(failures)) + " database(s)/table(s) failed to restore:")
+        for name in sorted(failures):
+            print("[ERROR]:   " + name + ": " + failures[name])
+        exit(1)
+    if journal.path is not None:
+        # nothing left to resume, the next run needs no --fresh
+        os.remove(journal.path)
+    print("[INFO]: restore finished")
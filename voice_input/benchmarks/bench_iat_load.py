@@ -0,0 +1,227 @@
+"""听写客户端负载基准。
+
+把 WAV 样本（16 kHz、16 bit、单声道）以 N 路并发回放给 ``recognize()``，
+统计吞吐、单会话延迟分位数与客户端每会话 CPU 时间。默认在子进程中启动本地替身服务，
+也可用 ``--url`` 指向其他服务。在 voice_input 目录下运行：
+
+    python3 -m benchmarks.bench_iat_load fixtures/ --sessions 1 8 32 --latency-ms 20
+    python3 -m benchmarks.bench_iat_load --synthetic-seconds 5 --client async --sessions 64
+    python3 -m benchmarks.bench_iat_load fixtures/ --recognizer race --vosk-model ~/vosk-model-small-cn-0.22 \
+        --final-latency-ms 1500 --race-budget 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+from src.voice_input.async_client import AsyncXFYunIatClient
+from src.voice_input.config import XFYunCredentials
+from src.voice_input.encoders import ENCODERS
+from src.voice_input.recognizers import RECOGNIZERS, RacingRecognizer, Recognizer, VoskRecognizer
+from src.voice_input.speech_client import XFYunIatClient
+
+_CREDENTIALS = XFYunCredentials(app_id="bench", api_key="bench", api_secret="bench")
+
+
+def _load_fixtures(inputs: List[str], synthetic_seconds: float) -> List[Tuple[str, bytes]]:
+    paths: List[Path] = []
+    for item in inputs:
+        path = Path(item)
+        paths.extend(sorted(path.rglob("*.wav")) if path.is_dir() else [path])
+
+    fixtures = []
+    for path in paths:
+        with wave.open(str(path), "rb") as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (16000, 1, 2):
+                print(f"跳过 {path}：需要 16 kHz、16 bit 单声道")
+                continue
+            fixtures.append((path.name, wav.readframes(wav.getnframes())))
+    if not fixtures:
+        # 低幅噪声即可，替身服务只按时长产出结果
+        fixtures.append(("synthetic", bytes(int(synthetic_seconds * 16000) * 2)))
+    return fixtures
+
+
+def _frames(audio: bytes, frame_bytes: int = 1280):
+    # 与 AudioRecorder.split_pcm 相同的零拷贝切分，避免基准依赖 PortAudio
+    view = memoryview(audio)
+    return (view[start : start + frame_bytes] for start in range(0, len(view), frame_bytes))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_stub(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "src.voice_input.stub_server",
+        "--port",
+        str(port),
+        "--latency-ms",
+        str(args.latency_ms),
+        "--final-latency-ms",
+        str(args.final_latency_ms),
+        "--error-rate",
+        str(args.error_rate),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process, f"ws://127.0.0.1:{port}/v2/iat"
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("替身服务启动超时")
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def _build_recognizer(args: argparse.Namespace, url: Optional[str]) -> Recognizer:
+    client = XFYunIatClient(_CREDENTIALS, url=url, audio_encoding=args.audio_encoding) if url else None
+    if args.recognizer == "xfyun":
+        return client
+    local = VoskRecognizer(args.vosk_model)
+    if args.recognizer == "vosk":
+        return local
+    return RacingRecognizer(client, local, primary_budget=args.race_budget)
+
+
+def _run_sync(client: Recognizer, fixtures, sessions: int, total: int) -> Tuple[List[float], int]:
+    def one(index: int) -> Optional[float]:
+        _, audio = fixtures[index % len(fixtures)]
+        started = time.perf_counter()
+        try:
+            client.recognize(_frames(audio))
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(one, range(total)))
+    latencies = [value for value in results if value is not None]
+    return latencies, len(results) - len(latencies)
+
+
+def _run_async(
+    url: str, fixtures, sessions: int, total: int, realtime_factor: Optional[float], encoding: str
+) -> Tuple[List[float], int]:
+    client = AsyncXFYunIatClient(_CREDENTIALS, url=url, realtime_factor=realtime_factor, audio_encoding=encoding)
+
+    async def run() -> Tuple[List[float], int]:
+        limit = asyncio.Semaphore(sessions)
+        latencies: List[float] = []
+        errors = 0
+
+        async def one(index: int) -> None:
+            nonlocal errors
+            _, audio = fixtures[index % len(fixtures)]
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    await client.recognize_async(_frames(audio))
+                except Exception:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one(index) for index in range(total)))
+        return latencies, errors
+
+    return asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="听写客户端负载基准")
+    parser.add_argument("inputs", nargs="*", help="WAV 文件或目录")
+    parser.add_argument("--synthetic-seconds", type=float, default=5.0, help="未给出 WAV 时合成音频的时长")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16], help="并发会话数")
+    parser.add_argument("--rounds", type=int, default=4, help="每个并发级别回放的轮数")
+    parser.add_argument("--client", choices=["sync", "async"], default="sync")
+    parser.add_argument("--realtime-factor", type=float, default=None, help="async 客户端的发送速度倍数")
+    parser.add_argument("--audio-encoding", choices=sorted(ENCODERS), default="raw", help="上传前的压缩方式")
+    parser.add_argument("--url", help="已有服务地址，不指定则启动本地替身服务")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="替身服务每条结果的延迟")
+    parser.add_argument("--final-latency-ms", type=float, default=0.0, help="替身服务最终结果的延迟")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="替身服务的错误注入概率")
+    parser.add_argument(
+        "--recognizer",
+        choices=RECOGNIZERS,
+        default="xfyun",
+        help="sync 客户端的识别后端：vosk 只跑本地引擎，不启动替身服务；race 与替身服务竞速",
+    )
+    parser.add_argument("--vosk-model", default=os.environ.get("VOSK_MODEL"), help="Vosk 模型目录")
+    parser.add_argument("--race-budget", type=float, default=1.0, help="race 后端优先等待讯飞结果的秒数")
+    args = parser.parse_args()
+    if args.recognizer != "xfyun":
+        if args.client != "sync":
+            parser.error("--recognizer vosk/race 只支持 sync 客户端")
+        if not args.vosk_model:
+            parser.error("--recognizer vosk/race 需要 --vosk-model 或环境变量 VOSK_MODEL")
+    # 逐包 DEBUG 日志会计入客户端 CPU，基准中只保留警告
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    fixtures = _load_fixtures(args.inputs, args.synthetic_seconds)
+    audio_seconds = sum(len(audio) for _, audio in fixtures) / 32000 / len(fixtures)
+    print(
+        f"样本 {len(fixtures)} 个，平均 {audio_seconds:.1f}s，客户端 {args.client}，"
+        f"编码 {args.audio_encoding}，后端 {args.recognizer}"
+    )
+
+    stub = None
+    url = args.url
+    if url is None and args.recognizer != "vosk":
+        stub, url = _start_stub(args)
+    try:
+        recognizer = _build_recognizer(args, url) if args.client == "sync" else None
+        print(f"{'并发':>6} {'会话':>6} {'失败':>5} {'会话/s':>8} {'倍实时':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'CPU ms/会话':>11}")
+        for sessions in args.sessions:
+            total = max(sessions * args.rounds, len(fixtures))
+            wall_started = time.perf_counter()
+            cpu_started = time.process_time()
+            if args.client == "async":
+                latencies, errors = _run_async(
+                    url, fixtures, sessions, total, args.realtime_factor, args.audio_encoding
+                )
+            else:
+                latencies, errors = _run_sync(recognizer, fixtures, sessions, total)
+            wall = time.perf_counter() - wall_started
+            cpu = time.process_time() - cpu_started
+            if not latencies:
+                print(f"{sessions:>6} {total:>6} {errors:>5}  全部失败")
+                continue
+            print(
+                f"{sessions:>6} {total:>6} {errors:>5} {total / wall:>8.1f} {total * audio_seconds / wall:>8.1f}"
+                f" {_percentile(latencies, 50) * 1000:>8.1f} {_percentile(latencies, 95) * 1000:>8.1f}"
+                f" {_percentile(latencies, 99) * 1000:>8.1f} {cpu / total * 1000:>11.2f}"
+            )
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""对比听写数据帧的两种编码路径。
+
+旧路径：每帧构造嵌套 dict、base64 后 decode 为 str，再整体 json.dumps。
+新路径：IatFrameEncoder 预编译模板并复用缓冲区。
+
+默认模拟 1 小时 16 kHz/16 bit 单声道音频，在 voice_input 目录下运行：
+
+    python3 -m benchmarks.bench_packet_encoder --seconds 3600
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import time
+from typing import Callable, Dict
+
+from src.voice_input.packets import IatFrameEncoder, frame_bytes_for
+
+_BUSINESS: Dict[str, object] = {"language": "zh_cn", "domain": "iat", "accent": "mandarin", "vad_eos": 3000}
+_APP_ID = "bench"
+
+
+def _legacy_packet(audio: bytes, *, status: int, include_meta: bool) -> str:
+    # 与改动前 XFYunIatClient._make_data_packet 相同：音频原样交给 base64，业务参数每次新建 dict
+    data = {
+        "status": status,
+        "audio": base64.b64encode(audio).decode("utf-8"),
+        "format": "audio/L16;rate=16000",
+        "encoding": "raw",
+    }
+    payload = {"data": data}
+    if include_meta:
+        payload["common"] = {"app_id": _APP_ID}
+        payload["business"] = dict(_BUSINESS)
+    return json.dumps(payload)
+
+
+def _run(
+    label: str,
+    encode: Callable[[memoryview, int, bool], object],
+    audio: memoryview,
+    frame_bytes: int,
+    total: int,
+    repeat: int,
+) -> float:
+    frames = total // frame_bytes
+    per_pass = len(audio) // frame_bytes
+    # 取多轮中最快的一轮，减少调度抖动
+    elapsed = float("inf")
+    for _ in range(repeat):
+        sent = 0
+        started = time.perf_counter()
+        for index in range(frames):
+            offset = (index % per_pass) * frame_bytes
+            payload = encode(audio[offset : offset + frame_bytes], 0 if index == 0 else 1, index == 0)
+            sent += len(payload)  # type: ignore[arg-type]
+        encode(audio[:0], 2, False)
+        elapsed = min(elapsed, time.perf_counter() - started)
+    print(f"{label:<28} {frames:>8} 帧  {elapsed:8.3f}s  {elapsed / frames * 1e6:7.2f} µs/帧  {sent / 1e6:9.1f} MB")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="听写数据帧编码微基准")
+    parser.add_argument("--seconds", type=float, default=3600.0, help="模拟音频时长（秒）")
+    parser.add_argument("--frame-millis", type=int, nargs="+", default=[40, 80, 160], help="每帧时长，40 的整数倍")
+    parser.add_argument("--repeat", type=int, default=3, help="每种编码重复的轮数，取最快一轮")
+    args = parser.parse_args()
+
+    total = int(args.seconds * 16000 * 2)
+    # 循环复用 8 MB 随机数据，避免生成整小时音频本身成为瓶颈
+    audio = memoryview(os.urandom(8 * 1024 * 1024))
+    print(f"模拟音频 {args.seconds:.0f}s，共 {total / 1e6:.1f} MB PCM")
+
+    for frame_millis in args.frame_millis:
+        frame_bytes = frame_bytes_for(frame_millis)
+        encoder = IatFrameEncoder(app_id=_APP_ID, business=_BUSINESS, frame_bytes=frame_bytes)
+        print(f"\n帧长 {frame_millis} ms（{frame_bytes} 字节）")
+        legacy = _run(
+            "dict + json.dumps",
+            lambda chunk, status, meta: _legacy_packet(chunk, status=status, include_meta=meta),
+            audio,
+            frame_bytes,
+            total,
+            args.repeat,
+        )
+        compiled = _run(
+            "IatFrameEncoder",
+            lambda chunk, status, meta: encoder.encode(chunk, status=status, include_meta=meta),
+            audio,
+            frame_bytes,
+            total,
+            args.repeat,
+        )
+        print(f"{'加速比':<28} {legacy / compiled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
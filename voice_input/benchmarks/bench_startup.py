@@ -0,0 +1,95 @@
+"""启动耗时基准。
+
+在全新解释器中以 ``-X importtime`` 导入入口模块，汇总各模块累计导入耗时，
+并多次测量进程墙钟时间。同时检查入口模块是否提前导入了重依赖。在 voice_input 目录下运行：
+
+    python3 -m benchmarks.bench_startup
+    python3 -m benchmarks.bench_startup --runs 20 --max-ms 150   # 超过阈值时以非零状态退出
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+_TARGETS = {
+    "app": "src.voice_input.app",
+    "trigger": "src.voice_input.trigger",
+}
+# 入口模块不应在导入时加载的依赖：它们要么初始化音频设备、连接 X/辅助功能，要么本身导入很慢
+_HEAVY = ("numpy", "sounddevice", "pynput", "websocket", "websockets", "pyperclip")
+
+
+def _import_times(module: str) -> Tuple[Dict[str, int], int]:
+    """返回 {顶层导入的模块: 累计微秒} 与全部导入的累计微秒。"""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative: Dict[str, int] = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, package = line.split("|")
+        name = package.strip()
+        cumulative[name] = max(cumulative.get(name, 0), int(cumulative_us))
+        if len(package) - len(package.lstrip()) == 1:
+            # 缩进一格的是解释器直接导入的顶层模块，其累计值之和即总导入耗时
+            total += int(cumulative_us)
+    return cumulative, total
+
+
+def _wall_times(module: str, runs: int) -> List[float]:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="语音输入助手启动耗时基准")
+    parser.add_argument("--target", choices=sorted(_TARGETS), nargs="+", default=sorted(_TARGETS))
+    parser.add_argument("--runs", type=int, default=10, help="墙钟时间测量次数")
+    parser.add_argument("--top", type=int, default=10, help="列出累计耗时最多的模块数")
+    parser.add_argument("--max-ms", type=float, help="app 导入耗时上限，超过时以非零状态退出")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    baseline = statistics.median(_wall_times("sys", args.runs))
+    print(f"空解释器启动 {baseline:.1f} ms（中位数）")
+
+    failed = False
+    for target in args.target:
+        module = _TARGETS[target]
+        cumulative, total = _import_times(module)
+        wall = _wall_times(module, args.runs)
+        print(f"\n{module}")
+        print(f"  导入耗时 {total / 1000:.1f} ms，进程墙钟 {statistics.median(wall):.1f} ms（中位数）")
+        print("  累计耗时最多的模块:")
+        for name, micros in sorted(cumulative.items(), key=lambda item: -item[1])[: args.top]:
+            print(f"    {micros / 1000:8.1f} ms  {name}")
+
+        heavy = [name for name in _HEAVY if name in cumulative]
+        if heavy:
+            print(f"  提前导入了重依赖: {', '.join(heavy)}")
+            failed = True
+        if args.max_ms is not None and target == "app" and total / 1000 > args.max_ms:
+            print(f"  导入耗时超过上限 {args.max_ms:.0f} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
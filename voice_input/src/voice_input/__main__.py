@@ -0,0 +1,35 @@
+"""命令行入口。
+
+    python3 -m src.voice_input                 # 启动快捷键语音输入助手
+    python3 -m src.voice_input transcribe ...  # 批量转写音频文件
+    python3 -m src.voice_input daemon ...      # 常驻后台，只通过控制 socket 触发
+    python3 -m src.voice_input trigger toggle  # 向常驻进程发送控制命令
+"""
+from __future__ import annotations
+
+import sys
+from typing import Iterable, Optional
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    # 按子命令延迟导入：批量转写不需要麦克风、快捷键等桌面依赖
+    if args and args[0] == "transcribe":
+        from .transcribe import main as transcribe_main
+
+        return transcribe_main(args[1:])
+    if args and args[0] == "trigger":
+        from .trigger import main as trigger_main
+
+        return trigger_main(args[1:])
+    if args and args[0] == "daemon":
+        args = ["--socket", "--no-hotkey", *args[1:]]
+
+    from .app import main as app_main
+
+    app_main(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
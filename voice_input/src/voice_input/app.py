@@ -1,88 +1,571 @@
-"""主程序入口。"""
+"""主程序入口。
+
+numpy、sounddevice、pynput、websocket-client、pyperclip 等依赖在首次录音或插入时才导入，
+冷启动只需加载标准库、loguru 与读取凭据所需的 python-dotenv。
+"""
 from __future__ import annotations
 
+import argparse
+import functools
+import importlib
+import os
 import threading
-from typing import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Generic, Iterable, Optional, TypeVar, Union
 
 from loguru import logger
 
-from .audio import AudioRecorder
-from .config import XFYunCredentials, load_credentials
-from .hotkey import GlobalHotkey
-from .insertion import TextInserter
-from .speech_client import XFYunAPIError, XFYunIatClient
+from .encoders import ENCODERS, create_encoder
+from .recognizers import RECOGNIZERS
+from .telemetry import tracer
+from .utterances import UtteranceQueue
+
+if TYPE_CHECKING:
+    from .audio import AudioRecorder
+    from .config import XFYunCredentials
+    from .corrections import CorrectionDictionary
+    from .insertion import IncrementalInserter, TextInserter
+    from .recognizers import Recognizer
+    from .speech_client import IatStreamingSession, XFYunIatClient
+    from .vad import VadConfig, VoiceActivityTrimmer
+
+_T = TypeVar("_T")
+
+
+class _lazy(Generic[_T]):
+    """线程安全的延迟初始化属性，首次访问时才导入依赖并构造。"""
+
+    def __init__(self, factory: Callable[..., _T]) -> None:
+        self._factory = factory
+        self._name = factory.__name__
+        self._lock = threading.Lock()
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, instance, owner=None) -> _T:
+        if instance is None:
+            return self  # type: ignore[return-value]
+        with self._lock:
+            if self._name not in instance.__dict__:
+                instance.__dict__[self._name] = self._factory(instance)
+        return instance.__dict__[self._name]
 
 
 class VoiceInputApp:
-    def __init__(self, hotkey: str = "<shift>+<space>") -> None:
-        self._credentials: XFYunCredentials = load_credentials()
-        self._client = XFYunIatClient(self._credentials)
-        self._recorder = AudioRecorder()
-        self._inserter = TextInserter()
-        self._hotkey = GlobalHotkey(hotkey, self._toggle_recording)
+    def __init__(
+        self,
+        hotkey: str = "<shift>+<space>",
+        *,
+        streaming: bool = False,
+        preconnect: bool = False,
+        vad: Optional[VadConfig] = None,
+        workers: int = 2,
+        queue_size: int = 8,
+        incremental: bool = False,
+        audio_encoding: str = "raw",
+        persistent: bool = False,
+        preroll_millis: int = 500,
+        segment_workers: int = 8,
+        device: Optional[Union[int, str]] = None,
+        native_capture: bool = False,
+        spill_seconds: Optional[float] = 120.0,
+        max_record_seconds: Optional[float] = 7200.0,
+        insert_strategy: str = "auto",
+        recognizer: str = "xfyun",
+        vosk_model: Optional[Union[str, Path]] = None,
+        race_budget: float = 1.0,
+        dictionary: Optional[Union[str, Path]] = None,
+        hot_words: bool = False,
+    ) -> None:
+        if recognizer not in RECOGNIZERS:
+            raise ValueError(f"不支持的识别后端: {recognizer}")
+        if recognizer != "xfyun":
+            if streaming or incremental or preconnect:
+                raise ValueError("流式识别、增量键入与预建连接只适用于讯飞后端")
+            if vosk_model is None:
+                raise ValueError(f"{recognizer} 后端需要指定 Vosk 模型目录（--vosk-model 或环境变量 VOSK_MODEL）")
+        # 凭据读取很快，启动时即加载：缺失时直接报错，而不是在快捷键回调里才失败
+        from .config import MissingCredentialError, load_credentials
+
+        self._credentials: Optional[XFYunCredentials] = None
+        if recognizer != "vosk":
+            try:
+                self._credentials = load_credentials()
+            except MissingCredentialError as exc:
+                if recognizer == "xfyun":
+                    raise
+                logger.warning("未配置讯飞凭据，竞速模式只使用本地识别: {}", exc)
+        # 依赖缺失（如 lameenc）时在启动阶段即报错，编码器模块本身很轻
+        create_encoder(audio_encoding)
+        self._audio_encoding = audio_encoding
+        self._hotkey_combination = hotkey
+        self._streaming = streaming or incremental
+        self._incremental = incremental
+        self._preconnect = preconnect
+        self._persistent = persistent
+        self._preroll_millis = preroll_millis
+        self._device = device
+        self._native_capture = native_capture
+        self._spill_seconds = spill_seconds
+        self._max_record_seconds = max_record_seconds
+        self._insert_strategy = insert_strategy
+        self._vad = vad
+        self._segment_workers = segment_workers
+        self._recognizer_name = recognizer
+        self._vosk_model = vosk_model
+        self._race_budget = race_budget
+        if hot_words and dictionary is None:
+            raise ValueError("--hot-words 需要配合 --dictionary 使用")
+        self._hot_words = hot_words
+        self._corrections: Optional[CorrectionDictionary] = None
+        if dictionary is not None:
+            from .corrections import CorrectionDictionary
+
+            # 词典只依赖标准库，启动时即编译，路径或内容有误时直接报错
+            self._corrections = CorrectionDictionary(dictionary, on_reload=self._on_dictionary_reload)
+        self._session: Optional[IatStreamingSession] = None
+        self._typer: Optional[IncrementalInserter] = None
         self._recording = False
         self._lock = threading.Lock()
-        self._processing_thread: threading.Thread | None = None
+        self._warmed = False
+        self._utterances = UtteranceQueue(self._deliver, workers=workers, maxsize=queue_size)
+
+    @_lazy
+    def _client(self) -> XFYunIatClient:
+        from .config import MissingCredentialError
+        from .speech_client import IatBusinessConfig, XFYunIatClient
+
+        if self._credentials is None:
+            raise MissingCredentialError("请在 .env 中配置 APPID、APIKey、APISecret")
+        # 增量键入依赖动态修正结果，且只能在流式模式下边说边出字
+        business = IatBusinessConfig(dwa="wpgs") if self._incremental else None
+        client = XFYunIatClient(self._credentials, business=business, audio_encoding=self._audio_encoding)
+        if self._hot_words and self._corrections is not None:
+            client.set_hot_words(self._corrections.hot_words)
+        return client
+
+    @_lazy
+    def _recognizer(self) -> Recognizer:
+        """整段识别所用的后端；本地模型加载较慢，首次录音时在后台预热。"""
+
+        if self._recognizer_name == "xfyun":
+            return self._client
+        from .recognizers import RacingRecognizer, VoskRecognizer
+
+        local = VoskRecognizer(self._vosk_model)
+        if self._recognizer_name == "vosk" or self._credentials is None:
+            return local
+        try:
+            client = self._client
+        except Exception as exc:
+            # 例如未配置讯飞凭据：竞速退化为只用本地引擎
+            logger.warning("讯飞客户端不可用，只使用本地识别: {}", exc)
+            return local
+        return RacingRecognizer(client, local, primary_budget=self._race_budget)
+
+    @_lazy
+    def _recorder(self) -> AudioRecorder:
+        from .audio import AudioRecorder
+
+        return AudioRecorder(
+            persistent=self._persistent,
+            preroll_millis=self._preroll_millis,
+            device=self._device,
+            native_capture=self._native_capture,
+            spill_seconds=self._spill_seconds,
+            max_seconds=self._max_record_seconds,
+            on_limit=self._on_record_limit,
+        )
+
+    @_lazy
+    def _inserter(self) -> TextInserter:
+        from .insertion import TextInserter
+
+        return TextInserter(strategy=self._insert_strategy)
+
+    @_lazy
+    def _trimmer(self) -> Optional[VoiceActivityTrimmer]:
+        if self._vad is None:
+            return None
+        from .vad import VoiceActivityTrimmer
+
+        return VoiceActivityTrimmer(self._vad)
+
+    @property
+    def recording(self) -> bool:
+        return self._recording
+
+    def run(self, *, hotkey: bool = True, control_socket: Optional[Path] = None) -> None:
+        """阻塞运行；``control_socket`` 给出时同时监听本地控制命令，``hotkey=False`` 时只接受该命令。"""
+
+        server = None
+        if control_socket is not None:
+            from .daemon import ControlServer
+
+            # 先占用 socket：已有实例在运行时不再打开麦克风与快捷键
+            server = ControlServer(self, control_socket)
+        if self._streaming:
+            logger.info("已启用流式识别：录音同时上传音频")
+        if self._persistent:
+            self._recorder.open()
+        listener = None
+        if hotkey:
+            from .hotkey import GlobalHotkey
+
+            listener = GlobalHotkey(self._hotkey_combination, self._toggle_recording)
+            logger.info("语音输入助手已启动，快捷键 {}", listener.combination)
+            logger.info("按下快捷键开始录音，再按一次结束并识别")
+            listener.start()
+        try:
+            if listener is not None:
+                if server is not None:
+                    threading.Thread(target=server.serve_forever, name="control-socket", daemon=True).start()
+                listener.join()
+            elif server is not None:
+                server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.close()
+            if "_recorder" in self.__dict__:
+                self._recorder.close()
+            stats = self._utterances.stats()
+            logger.info(
+                "识别队列统计：完成 {} 段，丢弃 {} 段，最长排队等待 {:.2f}s",
+                stats.completed,
+                stats.rejected,
+                stats.max_wait,
+            )
+            self._utterances.shutdown(wait=False)
+            if "_inserter" in self.__dict__:
+                self._inserter.close()
+            tracer.close()
+
+    def toggle(self) -> bool:
+        """开始或结束录音，返回切换后是否处于录音状态。"""
 
-    def run(self) -> None:
-        logger.info("语音输入助手已启动，快捷键 {}", self._hotkey.combination)
-        logger.info("按下快捷键开始录音，再按一次结束并识别")
-        self._hotkey.start()
-        self._hotkey.join()
+        self._toggle_recording()
+        return self._recording
+
+    def _warm_up(self) -> None:
+        # 首次录音期间在后台导入识别与插入依赖并建好客户端，不占用结束录音后的等待
+        try:
+            self._recognizer
+            self._inserter
+            self._trimmer
+            importlib.import_module(f"{__package__}.longform")
+        except Exception as exc:
+            logger.error("初始化失败: {}", exc)
 
-    def _toggle_recording(self) -> None:
+    def _on_record_limit(self) -> None:
+        logger.warning("录音时长达到上限，自动结束录音")
+        self._toggle_recording(stop_only=True)
+
+    def _toggle_recording(self, *, stop_only: bool = False) -> None:
         with self._lock:
+            if stop_only and not self._recording:
+                # 上限触发前用户已手动结束
+                return
             if self._recording:
                 self._recording = False
                 audio = self._recorder.stop()
+                session, self._session = self._session, None
+                typer, self._typer = self._typer, None
                 if not audio:
+                    if session is not None:
+                        session.cancel()
+                    if typer is not None:
+                        typer.update("")
+                    if self._preconnect:
+                        self._client.discard_preconnected()
                     logger.warning("未捕获到音频，忽略本次识别")
                     return
-                if self._processing_thread and self._processing_thread.is_alive():
-                    logger.warning("上一段音频仍在识别中，请稍候")
-                    return
-                self._processing_thread = threading.Thread(
-                    target=self._process_audio,
-                    args=(audio,),
-                    daemon=True,
-                )
-                self._processing_thread.start()
+                if typer is not None:
+                    job = functools.partial(self._process_incremental, session, audio, typer)
+                elif session is not None:
+                    job = functools.partial(self._process_stream, session, audio)
+                else:
+                    job = functools.partial(self._process_audio, audio)
+                if not self._utterances.submit(job):
+                    if session is not None:
+                        session.cancel()
+                    if typer is not None:
+                        typer.update("")
+                    logger.error("识别队列已满（{} 段），丢弃本段录音", self._utterances.depth())
             else:
-                if self._processing_thread and self._processing_thread.is_alive():
-                    logger.warning("识别尚未完成，请稍后再试")
+                if not self._warmed:
+                    self._warmed = True
+                    threading.Thread(target=self._warm_up, name="warm-up", daemon=True).start()
+                try:
+                    self._start_recording()
+                except Exception as exc:
+                    # 在快捷键回调中抛出会终止监听线程，这里记录错误并保持空闲
+                    logger.error("无法开始录音: {}", exc)
+                    if self._session is not None:
+                        self._session.cancel()
+                    self._session = None
+                    self._typer = None
                     return
-                self._recorder.start()
                 self._recording = True
                 logger.info("开始录音... 再次按下快捷键结束")
 
-    def _process_audio(self, audio: bytes) -> None:
-        logger.info("开始向讯飞发送音频，长度 {} 字节", len(audio))
-        chunks = AudioRecorder.split_pcm(audio)
+    def _start_recording(self) -> None:
+        if "_inserter" in self.__dict__:
+            # 用户再次开始录音时上一次粘贴早已完成，此时恢复原剪贴板
+            self._inserter.restore_clipboard()
+        if self._streaming:
+            # 仅当前面没有待粘贴的片段时才边说边键入，否则会与其粘贴位置交错
+            if self._incremental and self._utterances.idle():
+                from .insertion import IncrementalInserter
+
+                self._typer = IncrementalInserter()
+            on_partial = None
+            if self._typer is not None:
+                on_partial = functools.partial(self._type_partial, self._typer)
+            self._session = self._client.open_session(on_partial=on_partial)
+            self._recorder.start(on_chunk=self._session.feed)
+        else:
+            if self._preconnect:
+                # 录音期间在后台完成握手，结束录音后直接发送音频
+                self._client.preconnect()
+            self._recorder.start()
+
+    def _process_stream(self, session: IatStreamingSession, audio: memoryview) -> Optional[str]:
+        logger.info("录音结束，等待流式识别结果，已录制 {} 字节", len(audio))
         try:
-            text = self._client.recognize(chunks)
+            text = session.finish()
+        except Exception as exc:
+            # 流式会话失败时（如建连失败），退回整段上传
+            logger.warning("流式识别失败，改为整段识别: {}", exc)
+            return self._process_audio(audio)
+        return self._check_text(text)
+
+    def _process_incremental(
+        self,
+        session: IatStreamingSession,
+        audio: memoryview,
+        typer: IncrementalInserter,
+    ) -> None:
+        # 中间结果已键入，这里只需把最终文本（或整段识别的回退结果）修正到位
+        text = self._process_stream(session, audio)
+        typer.update(text or "")
+
+    def _process_audio(self, audio: memoryview) -> Optional[str]:
+        from .longform import recognize_long
+        from .speech_client import XFYunAPIError
+
+        if self._trimmer is not None:
+            audio = self._trimmer.trim(audio)
+            if not audio:
+                logger.warning("未检测到语音，忽略本次识别")
+                return None
+        try:
+            recognizer = self._recognizer
+            logger.info("开始识别音频（{}），长度 {} 字节", recognizer.name, len(audio))
+            # 超过单次会话上限的录音在静音处切段并行识别
+            text = recognize_long(recognizer, audio, max_parallel=self._segment_workers)
         except XFYunAPIError as exc:
             logger.error("讯飞接口报错: {}", exc)
-            return
+            return None
         except Exception as exc:  # pragma: no cover - 捕获未知错误
             logger.exception("识别失败: {}", exc)
-            return
+            return None
+
+        return self._check_text(text)
 
+    def _type_partial(self, typer: IncrementalInserter, text: str) -> None:
+        typer.update(self._correct(text))
+
+    def _correct(self, text: str) -> str:
+        if self._corrections is None:
+            return text
+        return self._corrections.apply(text)
+
+    def _on_dictionary_reload(self, dictionary: CorrectionDictionary) -> None:
+        # 客户端尚未创建时不必更新，创建时会读取当前热词
+        if self._hot_words and "_client" in self.__dict__:
+            self._client.set_hot_words(dictionary.hot_words)
+
+    def _check_text(self, text: str) -> Optional[str]:
+        corrected = self._correct(text)
+        if corrected != text:
+            logger.debug("纠错词典改写: {} -> {}", text, corrected)
+            text = corrected
         if text.strip():
             logger.info("识别完成: {}", text)
-            self._inserter.insert(text)
-        else:
-            logger.info("讯飞返回空文本")
+            return text
+        logger.info("识别结果为空")
+        return None
+
+    def _deliver(self, text: str) -> None:
+        self._inserter.insert(text)
+
+
+def _parse_args(argv: Optional[Iterable[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="讯飞语音输入助手")
+    parser.add_argument("--hotkey", default="<shift>+<space>", help="全局快捷键，pynput 格式")
+    parser.add_argument("--no-hotkey", action="store_true", help="不注册全局快捷键，只通过 --socket 触发")
+    parser.add_argument(
+        "--socket",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="常驻并监听本地 Unix socket，接受 toggle/start/stop/status 命令；不给路径时使用默认位置",
+    )
+    parser.add_argument("--streaming", action="store_true", help="边录音边上传，缩短结束录音后的等待")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="边说边键入中间结果，修正时只重打变化的部分（隐含 --streaming）",
+    )
+    parser.add_argument("--preconnect", action="store_true", help="按下快捷键时即在后台建立讯飞连接")
+    parser.add_argument(
+        "--persistent",
+        action="store_true",
+        help="输入流常开，按下快捷键即开始录音并带上之前的预录音频",
+    )
+    parser.add_argument("--preroll", type=int, default=500, metavar="MS", help="配合 --persistent，预录的毫秒数")
+    parser.add_argument("--device", help="输入设备编号或名称，默认使用系统默认麦克风")
+    parser.add_argument(
+        "--native-capture",
+        action="store_true",
+        help="按设备原生采样率与声道采集并实时转换为 16 kHz 单声道（设备不支持 16 kHz 时自动启用）",
+    )
+    parser.add_argument(
+        "--spill-seconds",
+        type=float,
+        default=120.0,
+        metavar="SECONDS",
+        help="录音超过该秒数后转存到 mmap 临时文件，内存占用不再随时长增长；0 表示始终留在内存",
+    )
+    parser.add_argument(
+        "--max-record-seconds",
+        type=float,
+        default=7200.0,
+        metavar="SECONDS",
+        help="单次录音时长上限，达到后自动结束并识别；0 表示不限制",
+    )
+    parser.add_argument("--vad", action="store_true", help="整段上传前裁剪首尾静音")
+    parser.add_argument(
+        "--max-pause",
+        type=int,
+        metavar="MS",
+        help="配合 --vad，将句中超过该毫秒数的停顿压缩",
+    )
+    parser.add_argument(
+        "--audio-encoding",
+        choices=sorted(ENCODERS),
+        default="raw",
+        help="上传前的压缩方式：speex-wb 需要系统 libspeex，lame 需要 pip install lameenc",
+    )
+    parser.add_argument(
+        "--segment-workers",
+        type=int,
+        default=8,
+        help="超过 55 秒的录音在静音处切段，最多同时识别的段数",
+    )
+    parser.add_argument(
+        "--insert",
+        choices=["auto", "type", "paste"],
+        default="auto",
+        help="文本插入方式：auto 时不含英文字母、数字与半角符号的 16 字以内文本直接模拟键入，其余通过剪贴板粘贴",
+    )
+    parser.add_argument(
+        "--recognizer",
+        choices=RECOGNIZERS,
+        default="xfyun",
+        help="识别后端：xfyun 在线听写，vosk 本地离线识别，race 两者同时识别并取先返回的结果",
+    )
+    parser.add_argument(
+        "--vosk-model",
+        default=os.environ.get("VOSK_MODEL"),
+        metavar="DIR",
+        help="Vosk 模型目录，vosk/race 后端需要，默认取环境变量 VOSK_MODEL",
+    )
+    parser.add_argument(
+        "--race-budget",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="配合 --recognizer race，讯飞在该秒数内返回时优先采用讯飞结果，设为 0 即纯竞速",
+    )
+    parser.add_argument(
+        "--dictionary",
+        metavar="FILE",
+        help="纠错词典，每行“误写 | 误写 => 正确写法”或单独的热词，文件修改后自动重新加载",
+    )
+    parser.add_argument(
+        "--hot-words",
+        action="store_true",
+        help="配合 --dictionary，把词典中的正确写法作为会话热词（dhw）随请求发送给讯飞",
+    )
+    parser.add_argument("--workers", type=int, default=2, help="并发识别的工作线程数")
+    parser.add_argument("--queue-size", type=int, default=8, help="等待识别的录音段数上限")
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="",
+        metavar="JSONL",
+        help="记录各阶段延迟，退出时输出 p50/p95/p99；给出路径时逐条写入 JSONL",
+    )
+    return parser.parse_args(None if argv is None else list(argv))
 
 
-def main() -> None:
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    args = _parse_args(argv)
     logger.remove()
     logger.add(lambda msg: print(msg, end=""))
+    if args.trace is not None:
+        tracer.enable(Path(args.trace) if args.trace else None)
     try:
-        app = VoiceInputApp()
+        vad = None
+        if args.vad:
+            from .vad import VadConfig
+
+            vad = VadConfig(max_pause_millis=args.max_pause)
+        app = VoiceInputApp(
+            args.hotkey,
+            streaming=args.streaming,
+            preconnect=args.preconnect,
+            vad=vad,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            incremental=args.incremental,
+            audio_encoding=args.audio_encoding,
+            persistent=args.persistent,
+            preroll_millis=args.preroll,
+            segment_workers=args.segment_workers,
+            device=int(args.device) if args.device and args.device.isdigit() else args.device,
+            native_capture=args.native_capture,
+            spill_seconds=args.spill_seconds or None,
+            max_record_seconds=args.max_record_seconds or None,
+            insert_strategy=args.insert,
+            recognizer=args.recognizer,
+            vosk_model=args.vosk_model,
+            race_budget=args.race_budget,
+            dictionary=args.dictionary,
+            hot_words=args.hot_words,
+        )
     except Exception as exc:
         logger.error("启动失败: {}", exc)
         return
-    app.run()
+    control_socket = None
+    if args.socket is not None:
+        from .trigger import default_socket_path
+
+        control_socket = Path(args.socket) if args.socket else default_socket_path()
+    elif args.no_hotkey:
+        logger.error("--no-hotkey 需要配合 --socket 使用")
+        return
+    if control_socket is None:
+        app.run(hotkey=not args.no_hotkey)
+        return
+    from .daemon import SocketInUseError
+
+    try:
+        app.run(hotkey=not args.no_hotkey, control_socket=control_socket)
+    except SocketInUseError as exc:
+        logger.error("启动失败: {}", exc)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+"""基于 asyncio 的讯飞听写客户端。
+
+与 ``XFYunIatClient`` 提供相同的 ``recognize`` 接口，另有 ``recognize_async``：
+同一连接上并发运行发送与接收任务，边发送边消费中间结果，
+多路会话可共用一个事件循环，无需为每个会话单独开线程。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import ssl
+import time
+from typing import AsyncIterable, Iterable, Optional, Union
+
+import websockets
+from loguru import logger
+
+from .config import XFYunCredentials
+from .speech_client import _XFYUN_URL, IatBusinessConfig, XFYunAPIError, XFYunIatClient, _ResultAccumulator
+from .telemetry import tracer
+
+AudioChunks = Union[Iterable[Union[bytes, memoryview]], AsyncIterable[Union[bytes, memoryview]]]
+
+# 16 kHz、16 bit 单声道 PCM 每秒字节数
+_BYTES_PER_SECOND = 16000 * 2
+
+
+class AsyncXFYunIatClient:
+    """全双工的 asyncio 听写客户端。"""
+
+    def __init__(
+        self,
+        credentials: XFYunCredentials,
+        *,
+        business: Optional[IatBusinessConfig] = None,
+        timeout: float = 10.0,
+        realtime_factor: Optional[float] = None,
+        audio_encoding: str = "raw",
+        url: str = _XFYUN_URL,
+    ) -> None:
+        """``realtime_factor`` 为发送速度相对实时的倍数，``None`` 表示不限速。"""
+
+        # 复用同步客户端的鉴权与数据包构造
+        self._packets = XFYunIatClient(
+            credentials, business=business, timeout=timeout, audio_encoding=audio_encoding, url=url
+        )
+        self._timeout = timeout
+        self._realtime_factor = realtime_factor
+        self._ssl = ssl.create_default_context()
+        self._ssl.check_hostname = False
+        self._ssl.verify_mode = ssl.CERT_NONE
+
+    def recognize(self, audio_chunks: AudioChunks) -> str:
+        """同步调用入口，不能在已运行的事件循环中使用。"""
+
+        return asyncio.run(self.recognize_async(audio_chunks))
+
+    async def recognize_async(self, audio_chunks: AudioChunks) -> str:
+        """将 PCM 音频分段发送到讯飞听写服务并返回识别结果。"""
+
+        with tracer.span("iat.sign_url"):
+            url = self._packets._construct_url()
+        logger.debug("连接讯飞听写服务: {}", url)
+        accumulator = _ResultAccumulator()
+        ssl_context = self._ssl if url.startswith("wss://") else None
+        connect_started = time.monotonic()
+        async with websockets.connect(url, ssl=ssl_context, open_timeout=self._timeout) as ws:
+            tracer.record("iat.connect", time.monotonic() - connect_started)
+            sender = asyncio.create_task(self._send(ws, audio_chunks))
+            receiver = asyncio.create_task(self._receive(ws, accumulator))
+            try:
+                await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if receiver.done() and not sender.done():
+                    # 服务端提前结束（通常是报错），不再继续发送
+                    sender.cancel()
+                    receiver.result()
+                    return accumulator.text()
+                await sender
+                await asyncio.wait_for(receiver, self._timeout)
+            except asyncio.TimeoutError as exc:
+                raise XFYunAPIError("等待讯飞识别结果超时") from exc
+            finally:
+                for task in (sender, receiver):
+                    if not task.done():
+                        task.cancel()
+        return accumulator.text()
+
+    async def _send(self, ws, audio_chunks: AudioChunks) -> None:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        sent_seconds = 0.0
+        writer = self._packets._new_writer()
+
+        async for chunk in _iterate(audio_chunks):
+            if not chunk:
+                continue
+            payload = writer.packet(chunk)
+            if payload is not None:
+                await ws.send(payload, text=True)
+
+            if self._realtime_factor:
+                sent_seconds += len(chunk) / _BYTES_PER_SECOND
+                delay = started + sent_seconds / self._realtime_factor - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                # 让出事件循环，保证接收任务与其他会话及时运行
+                await asyncio.sleep(0)
+
+        # 发送编码器剩余数据与结束包
+        for payload in writer.closing():
+            await ws.send(payload, text=True)
+
+    @staticmethod
+    async def _receive(ws, accumulator: _ResultAccumulator) -> None:
+        try:
+            async for raw_message in ws:
+                if accumulator.feed(json.loads(raw_message)):
+                    break
+        except websockets.ConnectionClosed:
+            pass
+
+
+async def _iterate(audio_chunks: AudioChunks):
+    if hasattr(audio_chunks, "__aiter__"):
+        async for chunk in audio_chunks:  # type: ignore[union-attr]
+            yield chunk
+    else:
+        for chunk in audio_chunks:  # type: ignore[union-attr]
+            yield chunk
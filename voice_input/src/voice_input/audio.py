@@ -1,16 +1,181 @@
 """音频采集工具。"""
 from __future__ import annotations
 
+import mmap
+import os
+import tempfile
 import threading
-from typing import Iterable
+from typing import IO, Callable, Iterable, List, Optional, Union
 
 import numpy as np
 import sounddevice as sd
 from loguru import logger
 
+from .resample import StreamingResampler, downmix
+from .telemetry import tracer
+
+# 转存后每写入这么多字节，就让已写满的页面脱离进程的驻留内存
+_RELEASE_BYTES = 4 * 1024 * 1024
+
+
+class PcmBuffer:
+    """预分配、可增长的 int16 PCM 缓冲区。
+
+    只允许一个写入方（录音回调线程）：样本先写入存储，再发布新的长度；
+    读取方先读长度再读存储，只访问已发布的部分，因此写路径无需加锁。
+    扩容时旧存储不会被改写，已导出的视图仍然有效。
+
+    超过 ``spill_samples`` 后改存到已删除的临时文件并以 mmap 访问，之后扩容只需扩大文件、
+    重新映射，不再复制；导出的视图直接引用映射。写入映射的脏页在写回前计入进程常驻内存，
+    因此每写满 4 MB 就对已写部分 ``madvise(MADV_DONTNEED)``：数据留在页缓存中由内核写回，
+    可随时回收，进程常驻内存保持有界，再次读取时按需换入。临时目录位于 tmpfs 时页缓存即内存，
+    录音仍会占用等量内存。写满 ``max_samples`` 后丢弃多余的样本，``full`` 变为真。
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        *,
+        channels: int = 1,
+        spill_samples: Optional[int] = None,
+        max_samples: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        for limit in (spill_samples, max_samples):
+            if limit is not None:
+                capacity = min(capacity, limit)
+        self._data = np.empty((max(capacity, 1), channels), dtype=np.int16)
+        self._length = 0
+        self._spill_samples = spill_samples
+        self._max_samples = max_samples
+        self._spill_dir = spill_dir
+        self._file: Optional[IO[bytes]] = None
+        self._mapping: Optional[mmap.mmap] = None
+        # 已让出常驻内存的字节数，按页对齐
+        self._released = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def full(self) -> bool:
+        return self._max_samples is not None and self._length >= self._max_samples
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def append(self, block: np.ndarray) -> memoryview:
+        """写入一个采集块，返回该块在缓冲区中的零拷贝视图（达到上限时只写入能容纳的部分）。"""
+
+        start = self._length
+        if self._max_samples is not None and start + len(block) > self._max_samples:
+            block = block[: max(self._max_samples - start, 0)]
+        end = start + len(block)
+        data = self._data
+        if end > len(data):
+            data = self._grow(data, start, end)
+        data[start:end] = block
+        self._data = data
+        self._length = end
+        if self._mapping is not None and (end * data.shape[1] * 2 - self._released) >= _RELEASE_BYTES:
+            self._release(end * data.shape[1] * 2)
+        return _as_bytes(data[start:end])
+
+    def view(self) -> memoryview:
+        """返回已写入部分的零拷贝字节视图。"""
+
+        length = self._length
+        return _as_bytes(self._data[:length])
+
+    def samples(self) -> np.ndarray:
+        length = self._length
+        return self._data[:length]
+
+    def _release(self, written: int) -> None:
+        # 共享文件映射上的 MADV_DONTNEED 只解除页表映射，脏页仍留在页缓存，不会丢数据
+        advice = getattr(mmap, "MADV_DONTNEED", None)
+        end = written - written % mmap.PAGESIZE
+        if advice is None or self._mapping is None or end <= self._released:
+            return
+        self._mapping.madvise(advice, self._released, end - self._released)
+        self._released = end
+
+    def _grow(self, data: np.ndarray, used: int, needed: int) -> np.ndarray:
+        capacity = max(needed, len(data) * 2)
+        if self._max_samples is not None:
+            capacity = min(capacity, self._max_samples)
+        if self._file is None and (self._spill_samples is None or needed <= self._spill_samples):
+            grown = np.empty((capacity, data.shape[1]), dtype=np.int16)
+            grown[:used] = data[:used]
+            return grown
+
+        first_spill = self._file is None
+        if first_spill:
+            # 创建即删除，只能经由本进程的映射访问，退出或视图全部释放后空间自动回收
+            self._file = tempfile.TemporaryFile(prefix="voice_input-", dir=self._spill_dir)
+        # 文件以稀疏方式扩大，旧映射与其视图仍指向同一批页面，无需复制
+        os.ftruncate(self._file.fileno(), capacity * data.shape[1] * 2)
+        mapping = mmap.mmap(self._file.fileno(), capacity * data.shape[1] * 2)
+        self._mapping = mapping
+        grown = np.frombuffer(mapping, dtype=np.int16).reshape(capacity, data.shape[1])
+        if first_spill:
+            grown[:used] = data[:used]
+            logger.info("录音超过 {:.1f} MB，改为写入临时文件", used * data.shape[1] * 2 / 1e6)
+        return grown
+
+
+def _as_bytes(samples: np.ndarray) -> memoryview:
+    return memoryview(samples.reshape(-1).view(np.uint8))
+
+
+class _PrerollRing:
+    """定长环形缓冲，保存常开输入流最近一段音频。只由录音回调线程读写。"""
+
+    def __init__(self, capacity: int, *, channels: int = 1) -> None:
+        self._data = np.zeros((max(capacity, 1), channels), dtype=np.int16)
+        self._write = 0
+        self._filled = 0
+
+    def write(self, block: np.ndarray) -> None:
+        capacity = len(self._data)
+        if len(block) >= capacity:
+            self._data[:] = block[-capacity:]
+            self._write = 0
+            self._filled = capacity
+            return
+        first = min(len(block), capacity - self._write)
+        self._data[self._write : self._write + first] = block[:first]
+        self._data[: len(block) - first] = block[first:]
+        self._write = (self._write + len(block)) % capacity
+        self._filled = min(self._filled + len(block), capacity)
+
+    def drain(self) -> List[np.ndarray]:
+        """按时间顺序返回缓冲内容（至多两段视图）并清空。"""
+
+        start = (self._write - self._filled) % len(self._data)
+        if start + self._filled <= len(self._data):
+            parts = [self._data[start : start + self._filled]]
+        else:
+            parts = [self._data[start:], self._data[: self._write]]
+        self._filled = 0
+        return parts
+
 
 class AudioRecorder:
-    """使用 sounddevice 采集麦克风音频。"""
+    """使用 sounddevice 采集麦克风音频。
+
+    ``persistent=True`` 时输入流在首次使用后保持打开，空闲期间的音频写入
+    ``preroll_millis`` 长度的环形缓冲；开始录音只需标记起点并带上这段预录音频，
+    无需每次重新初始化设备，也不会截掉第一个音节。
+
+    设备不支持 16 kHz 单声道时（常见于蓝牙耳机与 USB 声卡只提供 44.1/48 kHz），
+    按设备原生采样率与声道数（最多 2 个）采集，在回调中逐块下混并重采样，
+    缓冲区、预录与 ``on_chunk`` 拿到的始终是目标格式。``native_capture=True`` 强制走该路径。
+
+    录音超过 ``spill_seconds`` 后转存到 mmap 临时文件（见 :class:`PcmBuffer`）；
+    达到 ``max_seconds`` 时停止写入并在后台线程调用 ``on_limit``，由调用方结束录音。
+    """
 
     def __init__(
         self,
@@ -19,66 +184,210 @@ class AudioRecorder:
         channels: int = 1,
         dtype: str = "int16",
         chunk_millis: int = 40,
+        prealloc_seconds: float = 30.0,
+        persistent: bool = False,
+        preroll_millis: int = 500,
+        device: Optional[Union[int, str]] = None,
+        native_capture: bool = False,
+        spill_seconds: Optional[float] = 120.0,
+        max_seconds: Optional[float] = None,
+        on_limit: Optional[Callable[[], None]] = None,
     ) -> None:
         self._samplerate = samplerate
         self._channels = channels
         self._dtype = dtype
+        self._chunk_millis = chunk_millis
         self._chunk_size = int(self._samplerate * chunk_millis / 1000)
-        self._frames: list[np.ndarray] = []
+        self._device = device
+        self._native_capture = native_capture
+        # 采集格式与目标格式不同时，由录音回调线程独占使用
+        self._resampler: Optional[StreamingResampler] = None
+        self._prealloc_samples = int(self._samplerate * prealloc_seconds)
+        self._spill_samples = None if spill_seconds is None else int(samplerate * spill_seconds)
+        self._max_samples = None if max_seconds is None else int(samplerate * max_seconds)
+        self._on_limit = on_limit
+        # 本次录音是否已触发上限，只由录音回调线程读写
+        self._limit_reached = False
+        self._buffer: Optional[PcmBuffer] = None
         self._stream: sd.InputStream | None = None
+        # 仅保护 start/stop，录音回调不加锁
         self._lock = threading.Lock()
         self._active = False
+        self._on_chunk: Optional[Callable[[memoryview], None]] = None
+        self._persistent = persistent
+        self._preroll_millis = preroll_millis
+        self._ring = (
+            _PrerollRing(int(samplerate * preroll_millis / 1000), channels=channels) if persistent else None
+        )
+        # 由 start 置位，录音回调把预录音频移入新缓冲区后清除
+        self._claim_preroll = False
+        # 常开模式下 stop 等待回调确认已脱离录音缓冲区
+        self._detached = threading.Event()
+
+    def open(self) -> None:
+        """常开模式下提前打开输入流，使第一次录音也无需等待设备初始化。"""
+        with self._lock:
+            if self._persistent and self._stream is None:
+                self._stream = self._open_stream()
+                logger.info("输入流已常开，预录 {} ms", self._preroll_millis)
 
-    def start(self) -> None:
+    def close(self) -> None:
+        """关闭常开的输入流；录音中调用会丢弃本段音频。"""
         with self._lock:
+            self._active = False
+            self._buffer = None
+            self._on_chunk = None
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.stop()
+            stream.close()
+
+    def start(self, on_chunk: Optional[Callable[[memoryview], None]] = None) -> None:
+        """开始录音；传入 ``on_chunk`` 时每个采集块都会实时回调一次（流式识别）。"""
+        with tracer.span("recorder.start"), self._lock:
             if self._active:
                 return
-            self._frames = []
-            self._stream = sd.InputStream(
-                samplerate=self._samplerate,
+            self._buffer = PcmBuffer(
+                self._prealloc_samples,
                 channels=self._channels,
-                dtype=self._dtype,
-                blocksize=self._chunk_size,
-                callback=self._callback,
+                spill_samples=self._spill_samples,
+                max_samples=self._max_samples,
             )
-            self._stream.start()
-            self._active = True
+            self._limit_reached = False
+            self._on_chunk = on_chunk
+            if self._persistent:
+                if self._stream is None:
+                    self._stream = self._open_stream()
+                self._claim_preroll = True
+                self._active = True
+            else:
+                self._stream = self._open_stream(start=False)
+                self._active = True
+                self._stream.start()
             logger.info("开始录音")
 
-    def stop(self) -> bytes:
-        with self._lock:
+    def stop(self) -> memoryview:
+        """结束录音，返回整段 PCM 的零拷贝视图。"""
+        with tracer.span("recorder.stop"), self._lock:
             if not self._active:
-                return b""
+                return memoryview(b"")
             assert self._stream is not None
-            self._stream.stop()
-            self._stream.close()
             actual_rate = getattr(self._stream, "samplerate", self._samplerate)
-            self._stream = None
-            self._active = False
-            frames = self._frames
-            self._frames = []
-            logger.info("结束录音，帧数: {}，采样率: {}", len(frames), actual_rate)
+            if self._persistent:
+                self._detached.clear()
+                self._active = False
+                # 等回调写完正在处理的块，最多等待几个采集周期
+                self._detached.wait(4 * self._chunk_size / self._samplerate + 0.1)
+            else:
+                self._active = False
+                self._stream.stop()
+                self._stream.close()
+                self._stream = None
+            self._on_chunk = None
+            buffer, self._buffer = self._buffer, None
+            logger.info(
+                "结束录音，采样数: {}，设备采样率: {}{}",
+                len(buffer) if buffer else 0,
+                actual_rate,
+                "（已转存临时文件）" if buffer is not None and buffer.spilled else "",
+            )
 
-        if not frames:
-            return b""
+        if buffer is None or not len(buffer):
+            return memoryview(b"")
 
-        audio_array = np.concatenate(frames, axis=0)
-        rms = float(np.sqrt(np.mean(np.square(audio_array.astype(np.float32)))))
-        peak = int(np.max(np.abs(audio_array)))
+        samples = buffer.samples()
+        rms, peak = self._measure(samples)
         logger.debug("录音能量 RMS: {:.2f}, 峰值: {}", rms, peak)
 
-        return audio_array.tobytes()
+        return buffer.view()
+
+    def _open_stream(self, *, start: bool = True) -> sd.InputStream:
+        rate, channels = self._capture_format()
+        stream = sd.InputStream(
+            device=self._device,
+            samplerate=rate,
+            channels=channels,
+            dtype=self._dtype,
+            blocksize=int(rate * self._chunk_millis / 1000),
+            callback=self._callback,
+        )
+        # 部分驱动会静默换成其他采样率，以实际值为准
+        rate = int(getattr(stream, "samplerate", rate) or rate)
+        if (rate, channels) != (self._samplerate, self._channels):
+            logger.info("按设备格式采集 {} Hz / {} 声道，实时转换为 {} Hz 单声道", rate, channels, self._samplerate)
+            self._resampler = StreamingResampler(rate, self._samplerate)
+        else:
+            self._resampler = None
+        if start:
+            stream.start()
+        return stream
+
+    def _capture_format(self) -> tuple[int, int]:
+        if not self._native_capture:
+            try:
+                sd.check_input_settings(
+                    device=self._device,
+                    samplerate=self._samplerate,
+                    channels=self._channels,
+                    dtype=self._dtype,
+                )
+                return self._samplerate, self._channels
+            except Exception as exc:
+                if self._channels != 1:
+                    raise
+                logger.warning("输入设备不支持 {} Hz 单声道: {}", self._samplerate, exc)
+        info = sd.query_devices(self._device, "input")
+        return int(info["default_samplerate"]), max(1, min(int(info["max_input_channels"]), 2))
 
     def _callback(self, indata, frames, time, status) -> None:  # type: ignore[override]
         if status:
             logger.warning("录音状态: {}", status)
-        with self._lock:
-            if not self._active:
-                return
-            self._frames.append(indata.copy())
+        resampler = self._resampler
+        if resampler is not None:
+            # 逐块转换，滤波器状态跨块保留，延迟只有几十个采样
+            indata = resampler.process(downmix(indata)).reshape(-1, 1)
+        buffer = self._buffer
+        if not self._active or buffer is None:
+            ring = self._ring
+            if ring is not None:
+                ring.write(indata)
+                self._detached.set()
+            return
+        on_chunk = self._on_chunk
+        if self._claim_preroll:
+            self._claim_preroll = False
+            for part in self._ring.drain():
+                preroll = buffer.append(part)
+                if on_chunk is not None and len(preroll):
+                    for piece in self.split_pcm(preroll, self._chunk_size * 2 * self._channels):
+                        on_chunk(piece)
+        chunk = buffer.append(indata)
+        if on_chunk is not None and len(chunk):
+            on_chunk(chunk)
+        if buffer.full and not self._limit_reached:
+            self._limit_reached = True
+            logger.warning("录音已达上限 {:.0f} 秒，之后的音频被丢弃", len(buffer) / self._samplerate)
+            if self._on_limit is not None:
+                # 回调线程中不能停止输入流，交给其他线程结束录音
+                threading.Thread(target=self._on_limit, name="record-limit", daemon=True).start()
+
+    @staticmethod
+    def _measure(samples: np.ndarray, block: int = 1 << 17) -> tuple[float, int]:
+        """分块计算 RMS 与峰值，避免整段转换为 float32 的临时拷贝。"""
+        flat = samples.reshape(-1)
+        energy = 0.0
+        for start in range(0, len(flat), block):
+            part = flat[start : start + block].astype(np.float32)
+            energy += float(np.dot(part, part))
+        rms = float(np.sqrt(energy / len(flat)))
+        peak = max(int(flat.max()), -int(flat.min()))
+        return rms, peak
 
     @staticmethod
-    def split_pcm(audio: bytes, chunk_size: int = 1280) -> Iterable[bytes]:
-        """将 PCM 流拆分成固定大小的片段。"""
-        for start in range(0, len(audio), chunk_size):
-            yield audio[start : start + chunk_size]
+    def split_pcm(audio: Union[bytes, memoryview], chunk_size: int = 1280) -> Iterable[memoryview]:
+        """将 PCM 流拆分成固定大小的片段（零拷贝视图）。"""
+        view = memoryview(audio)
+        if view.format != "B" or view.ndim != 1:
+            view = view.cast("B")
+        for start in range(0, len(view), chunk_size):
+            yield view[start : start + chunk_size]
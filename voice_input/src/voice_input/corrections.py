@@ -0,0 +1,196 @@
+"""识别结果的纠错词典：多模式自动机一次扫描完成全部替换。
+
+词典为 UTF-8 文本，每行一条：
+
+    # 注释
+    派森 | 排森 => Python        # 多个误识别写法用 | 分隔
+    get user info => getUserInfo
+    科大讯飞                      # 只有词条、没有 => 时为热词，原样保留
+
+所有写法编译成一个 Aho-Corasick 自动机，对每段文本只做一次线性扫描，
+从左到右取最长匹配，结果与规则书写顺序无关；热词也参与匹配，可防止其内部被较短规则改写。
+以英文字母或数字开头/结尾的写法只在单词边界处匹配（``java`` 不会改写 ``javascript`` 的前缀）。
+词典文件修改后在下一次使用时自动重新加载。
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+
+_TRAILING_COMMENT = re.compile(r"\s+#.*$")
+
+
+class _Automaton:
+    """Aho-Corasick 自动机，``outputs[state]`` 为在该状态结束的全部模式长度（降序）。"""
+
+    def __init__(self, patterns: Dict[str, str]) -> None:
+        self.replacements = patterns
+        goto: List[Dict[str, int]] = [{}]
+        terminal: List[int] = [0]
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    terminal.append(0)
+                state = next_state
+            terminal[state] = len(pattern)
+
+        # 按广度优先计算失败指针，并把失败链上的输出合并到每个状态
+        fail = [0] * len(goto)
+        outputs: List[Tuple[int, ...]] = [()] * len(goto)
+        queue = [0]
+        for state in queue:
+            for char, child in goto[state].items():
+                queue.append(child)
+                if state:
+                    fallback = fail[state]
+                    while fallback and char not in goto[fallback]:
+                        fallback = fail[fallback]
+                    fail[child] = goto[fallback].get(char, 0)
+                own = (terminal[child],) if terminal[child] else ()
+                outputs[child] = own + outputs[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    def longest_from(self, text: str) -> List[int]:
+        """返回每个起点处最长匹配的长度（无匹配为 0）。"""
+
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        longest = [0] * len(text)
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length in outputs[state]:
+                start = end - length
+                if length > longest[start] and _on_boundary(text, start, end):
+                    longest[start] = length
+        return longest
+
+    def apply(self, text: str) -> str:
+        longest = self.longest_from(text)
+        pieces: List[str] = []
+        copied = index = 0
+        while index < len(text):
+            length = longest[index]
+            if not length:
+                index += 1
+                continue
+            pieces.append(text[copied:index])
+            pieces.append(self.replacements[text[index : index + length]])
+            index += length
+            copied = index
+        pieces.append(text[copied:])
+        return "".join(pieces)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and (char.isalnum() or char == "_")
+
+
+def _on_boundary(text: str, start: int, end: int) -> bool:
+    if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+        return False
+    if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+        return False
+    return True
+
+
+def parse_dictionary(content: str) -> Tuple[Dict[str, str], List[str]]:
+    """解析词典文本，返回 {写法: 替换结果} 与热词列表（替换结果与独立词条，去重且保持顺序）。"""
+
+    patterns: Dict[str, str] = {}
+    hot_words: Dict[str, None] = {}
+    for line_number, raw in enumerate(content.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        # 行尾注释需以空白开头，以免截断 C# 之类的词条
+        line = _TRAILING_COMMENT.sub("", line)
+        if "=>" in line:
+            sources, target = (part.strip() for part in line.split("=>", 1))
+            variants = [variant.strip() for variant in sources.split("|") if variant.strip()]
+            if not variants:
+                logger.warning("纠错词典第 {} 行缺少原写法，已忽略", line_number)
+                continue
+        else:
+            target, variants = line, [line]
+        for variant in variants:
+            if patterns.get(variant, target) != target:
+                logger.warning("纠错词典第 {} 行重复定义 {!r}，以后一条为准", line_number, variant)
+            patterns[variant] = target
+        if target:
+            hot_words[target] = None
+    return patterns, list(hot_words)
+
+
+class CorrectionDictionary:
+    """从文件加载的纠错词典，文件修改时间变化后在下一次 ``apply`` 时重新编译。
+
+    重新编译在调用线程中完成后整体替换，加载失败时保留旧词典。
+    ``on_reload`` 在每次（重新）加载成功后调用，可用于更新热词。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        on_reload: Optional[Callable[["CorrectionDictionary"], None]] = None,
+    ) -> None:
+        self._path = Path(path).expanduser()
+        self._on_reload = on_reload
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._automaton = _Automaton({})
+        self._hot_words: Tuple[str, ...] = ()
+        if not self.refresh():
+            raise ValueError(f"无法加载纠错词典: {self._path}")
+
+    @property
+    def hot_words(self) -> Tuple[str, ...]:
+        return self._hot_words
+
+    def apply(self, text: str) -> str:
+        self.refresh()
+        return self._automaton.apply(text)
+
+    def refresh(self) -> bool:
+        """文件有变化时重新加载，返回是否完成了加载。"""
+
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except OSError as exc:
+            if self._mtime is not None:
+                logger.debug("纠错词典不可读，继续使用已加载的版本: {}", exc)
+            return False
+        if mtime == self._mtime:
+            return False
+
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            try:
+                patterns, hot_words = parse_dictionary(self._path.read_text(encoding="utf-8"))
+                automaton = _Automaton(patterns)
+            except (OSError, UnicodeDecodeError) as exc:
+                # 记下该版本的修改时间，文件再次改动前不重复报错
+                self._mtime = mtime
+                logger.error("加载纠错词典失败，继续使用已加载的版本: {}", exc)
+                return False
+            self._automaton, self._hot_words, self._mtime = automaton, tuple(hot_words), mtime
+        logger.info("已加载纠错词典 {}：{} 条写法，{} 个热词", self._path.name, len(patterns), len(hot_words))
+        if self._on_reload is not None:
+            self._on_reload(self)
+        return True
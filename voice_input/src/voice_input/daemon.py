@@ -0,0 +1,110 @@
+"""常驻模式的本地控制 socket。
+
+每个连接发送一行命令、收到一行应答：
+
+    toggle / start / stop  ->  ok recording | ok idle
+    status                 ->  ok recording | ok idle
+    ping                   ->  ok pong
+"""
+from __future__ import annotations
+
+import os
+import socket
+import socketserver
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from .app import VoiceInputApp
+
+
+class SocketInUseError(RuntimeError):
+    """控制 socket 已被另一个正在运行的实例占用。"""
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_UnixServer"
+
+    def handle(self) -> None:
+        line = self.rfile.readline(256).decode("utf-8", "replace").strip().lower()
+        if not line:
+            # 连接后未发送命令即关闭
+            return
+        try:
+            reply = self.server.dispatch(line)
+        except Exception as exc:
+            logger.exception("控制命令 {} 执行失败", line)
+            reply = f"error {exc}"
+        self.wfile.write(reply.encode("utf-8") + b"\n")
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, app: "VoiceInputApp") -> None:
+        self.app = app
+        super().__init__(str(path), _Handler)
+
+    def dispatch(self, command: str) -> str:
+        app = self.app
+        if command == "ping":
+            return "ok pong"
+        if command == "toggle":
+            app.toggle()
+        elif command in ("start", "stop"):
+            if app.recording != (command == "start"):
+                app.toggle()
+        elif command != "status":
+            return f"error unknown command: {command}"
+        return "ok recording" if app.recording else "ok idle"
+
+
+class ControlServer:
+    """在 Unix socket 上接受 toggle/start/stop/status 命令，socket 仅当前用户可访问。"""
+
+    def __init__(self, app: "VoiceInputApp", path: Path) -> None:
+        self._path = path
+        self._serving = False
+        if path.exists():
+            _remove_stale_socket(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(path, app)
+        finally:
+            os.umask(previous_umask)
+        logger.info("控制 socket 已就绪: {}", path)
+
+    def serve_forever(self) -> None:
+        self._serving = True
+        self._server.serve_forever(poll_interval=0.5)
+
+    def close(self) -> None:
+        if self._serving:
+            # 未进入 serve_forever 时调用 shutdown 会一直阻塞
+            self._server.shutdown()
+        self._server.server_close()
+        try:
+            self._path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path: Path) -> None:
+    """仍有实例在监听时拒绝启动，只删除上次异常退出遗留、已无人监听的 socket 文件。"""
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        probe.settimeout(1.0)
+        try:
+            probe.connect(str(path))
+            probe.sendall(b"ping\n")
+            probe.recv(256)
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass
+        except OSError as exc:
+            raise SocketInUseError(f"无法确认 {path} 是否仍在使用: {exc}") from exc
+        else:
+            raise SocketInUseError(f"已有实例在监听 {path}")
+    path.unlink(missing_ok=True)
@@ -0,0 +1,179 @@
+"""上传前的音频编码。
+
+讯飞听写接口除 16 kHz PCM（``raw``）外还接受 speex / speex-wb 与 mp3（``lame``），
+压缩后每秒上传量从 32 KB 降到几 KB。编码器有状态，每个会话需单独创建。
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+from typing import Callable, Dict, List, Union
+
+AudioBytes = Union[bytes, bytearray, memoryview]
+
+
+class EncoderUnavailableError(RuntimeError):
+    """所选编码依赖的库不可用。"""
+
+
+class AudioEncoder:
+    """PCM 编码器基类，默认原样透传（``raw``）。"""
+
+    audio_format = "audio/L16;rate=16000"
+    encoding = "raw"
+
+    def encode(self, pcm: AudioBytes) -> AudioBytes:
+        """编码一段 PCM，返回可直接放入数据帧的字节；可能因缓冲而返回空。"""
+
+        return pcm
+
+    def flush(self) -> bytes:
+        """输出缓冲中剩余的数据，在结束包之前调用。"""
+
+        return b""
+
+
+class SpeexWbEncoder(AudioEncoder):
+    """讯飞定制的 speex 宽带编码：每个 20 ms 帧前加 1 字节帧长。
+
+    通过 ctypes 调用系统的 libspeex（macOS: ``brew install speex``，Debian: ``libspeex1``）。
+    ``quality`` 即 ``encoding=speex-wb;<quality>`` 中的压缩等级。
+    """
+
+    _SPEEX_GET_FRAME_SIZE = 3
+    _SPEEX_SET_QUALITY = 4
+    _SPEEX_MODEID_WB = 1
+
+    def __init__(self, quality: int = 7) -> None:
+        self._lib = _load_libspeex()
+        self.encoding = f"speex-wb;{quality}"
+
+        mode = self._lib.speex_lib_get_mode(self._SPEEX_MODEID_WB)
+        self._state = self._lib.speex_encoder_init(mode)
+        value = ctypes.c_int(quality)
+        self._lib.speex_encoder_ctl(self._state, self._SPEEX_SET_QUALITY, ctypes.byref(value))
+        frame_size = ctypes.c_int(0)
+        self._lib.speex_encoder_ctl(self._state, self._SPEEX_GET_FRAME_SIZE, ctypes.byref(frame_size))
+        self._frame_samples = frame_size.value
+        self._frame_bytes = frame_size.value * 2
+
+        self._bits = _SpeexBits()
+        self._lib.speex_bits_init(ctypes.byref(self._bits))
+        self._input = (ctypes.c_short * self._frame_samples)()
+        self._output = ctypes.create_string_buffer(256)
+        self._pending = bytearray()
+
+    def encode(self, pcm: AudioBytes) -> bytes:
+        self._pending += pcm
+        frames: List[bytes] = []
+        frame_bytes = self._frame_bytes
+        offset = 0
+        while len(self._pending) - offset >= frame_bytes:
+            frames.append(self._encode_frame(memoryview(self._pending)[offset : offset + frame_bytes]))
+            offset += frame_bytes
+        del self._pending[:offset]
+        return b"".join(frames)
+
+    def flush(self) -> bytes:
+        if not self._pending:
+            return b""
+        # 末尾不足一帧补静音
+        self._pending += bytes(self._frame_bytes - len(self._pending))
+        return self.encode(b"")
+
+    def _encode_frame(self, frame: memoryview) -> bytes:
+        ctypes.memmove(self._input, bytes(frame), self._frame_bytes)
+        self._lib.speex_bits_reset(ctypes.byref(self._bits))
+        self._lib.speex_encode_int(self._state, self._input, ctypes.byref(self._bits))
+        size = self._lib.speex_bits_write(ctypes.byref(self._bits), self._output, len(self._output))
+        return bytes((size,)) + self._output.raw[:size]
+
+    def __del__(self) -> None:
+        lib = getattr(self, "_lib", None)
+        if lib is not None and getattr(self, "_state", None):
+            lib.speex_encoder_destroy(self._state)
+            lib.speex_bits_destroy(ctypes.byref(self._bits))
+            self._state = None
+
+
+class LameEncoder(AudioEncoder):
+    """mp3 编码（``encoding=lame``），依赖可选包 ``lameenc``。讯飞仅对中英文支持该格式。"""
+
+    encoding = "lame"
+
+    def __init__(self, bitrate_kbps: int = 32) -> None:
+        try:
+            import lameenc
+        except ImportError as exc:
+            raise EncoderUnavailableError("使用 lame 编码需要安装 lameenc：pip install lameenc") from exc
+
+        self._encoder = lameenc.Encoder()
+        self._encoder.set_in_sample_rate(16000)
+        self._encoder.set_channels(1)
+        self._encoder.set_bit_rate(bitrate_kbps)
+        self._encoder.set_quality(5)
+
+    def encode(self, pcm: AudioBytes) -> bytes:
+        return bytes(self._encoder.encode(bytes(pcm)))
+
+    def flush(self) -> bytes:
+        return bytes(self._encoder.flush())
+
+
+class _SpeexBits(ctypes.Structure):
+    _fields_ = [
+        ("chars", ctypes.c_char_p),
+        ("nbBits", ctypes.c_int),
+        ("charPtr", ctypes.c_int),
+        ("bitPtr", ctypes.c_int),
+        ("owner", ctypes.c_int),
+        ("overflow", ctypes.c_int),
+        ("buf_size", ctypes.c_int),
+        ("reserved1", ctypes.c_int),
+        ("reserved2", ctypes.c_void_p),
+    ]
+
+
+_libspeex = None
+
+
+def _load_libspeex():
+    global _libspeex
+    if _libspeex is not None:
+        return _libspeex
+
+    path = ctypes.util.find_library("speex")
+    if path is None:
+        raise EncoderUnavailableError("未找到 libspeex，请先安装（macOS: brew install speex）")
+    lib = ctypes.CDLL(path)
+    lib.speex_lib_get_mode.restype = ctypes.c_void_p
+    lib.speex_lib_get_mode.argtypes = [ctypes.c_int]
+    lib.speex_encoder_init.restype = ctypes.c_void_p
+    lib.speex_encoder_init.argtypes = [ctypes.c_void_p]
+    lib.speex_encoder_ctl.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p]
+    lib.speex_encoder_destroy.argtypes = [ctypes.c_void_p]
+    lib.speex_encode_int.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_short), ctypes.c_void_p]
+    lib.speex_bits_init.argtypes = [ctypes.c_void_p]
+    lib.speex_bits_reset.argtypes = [ctypes.c_void_p]
+    lib.speex_bits_destroy.argtypes = [ctypes.c_void_p]
+    lib.speex_bits_write.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+    lib.speex_bits_write.restype = ctypes.c_int
+    _libspeex = lib
+    return lib
+
+
+ENCODERS: Dict[str, Callable[[], AudioEncoder]] = {
+    "raw": AudioEncoder,
+    "speex-wb": SpeexWbEncoder,
+    "lame": LameEncoder,
+}
+
+
+def create_encoder(name: str) -> AudioEncoder:
+    """按名称创建编码器：raw、speex-wb、lame。"""
+
+    try:
+        factory = ENCODERS[name]
+    except KeyError as exc:
+        raise ValueError(f"不支持的音频编码: {name}（可选 {', '.join(ENCODERS)}）") from exc
+    return factory()
@@ -6,6 +6,8 @@ from typing import Callable
 from loguru import logger
 from pynput import keyboard
 
+from .telemetry import tracer
+
 
 class GlobalHotkey:
     """包装 pynput 实现的全局快捷键。"""
@@ -32,4 +34,5 @@ class GlobalHotkey:
 
     def _handle_activate(self) -> None:
         logger.debug("触发快捷键 {}", self._combination)
-        self._on_activate()
+        with tracer.span("hotkey.activate"):
+            self._on_activate()
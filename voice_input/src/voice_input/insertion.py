@@ -1,42 +1,263 @@
 """向当前焦点应用填充文本。"""
 from __future__ import annotations
 
+import os
+import shutil
+import subprocess
+import sys
+import threading
 import time
-from typing import Optional
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
 
 import pyperclip
 from loguru import logger
-from pynput.keyboard import Controller, Key
 
+from .telemetry import tracer
+
+
+class KeyboardBackend(ABC):
+    """模拟键盘输入的后端。"""
+
+    name = ""
+
+    @abstractmethod
+    def type(self, text: str) -> None:
+        """键入文本。"""
+
+    @abstractmethod
+    def paste(self) -> None:
+        """发送粘贴快捷键。"""
+
+    @abstractmethod
+    def backspace(self, count: int) -> None:
+        """退格删除 ``count`` 个字符。"""
 
-class TextInserter:
-    """通过剪贴板 + Cmd+V 的方式插入文本。"""
+
+class PynputBackend(KeyboardBackend):
+    """使用 pynput，macOS 粘贴键为 Cmd，其余平台为 Ctrl。"""
+
+    name = "pynput"
 
     def __init__(self) -> None:
+        from pynput.keyboard import Controller, Key
+
         self._keyboard = Controller()
+        self._key = Key
+        self._paste_modifier = Key.cmd if sys.platform == "darwin" else Key.ctrl
+
+    def type(self, text: str) -> None:
+        self._keyboard.type(text)
+
+    def paste(self) -> None:
+        with self._keyboard.pressed(self._paste_modifier):
+            self._keyboard.press("v")
+            self._keyboard.release("v")
+
+    def backspace(self, count: int) -> None:
+        for _ in range(count):
+            self._keyboard.tap(self._key.backspace)
+
+
+class XdotoolBackend(KeyboardBackend):
+    """Linux X11 下调用 xdotool，不依赖 pynput 的 X 连接。"""
+
+    name = "xdotool"
+
+    def __init__(self, executable: str = "xdotool") -> None:
+        self._executable = executable
+
+    def type(self, text: str) -> None:
+        self._run("type", "--clearmodifiers", "--delay", "0", "--", text)
+
+    def paste(self) -> None:
+        self._run("key", "--clearmodifiers", "ctrl+v")
+
+    def backspace(self, count: int) -> None:
+        if count:
+            self._run("key", "--clearmodifiers", "--delay", "0", "--repeat", str(count), "BackSpace")
+
+    def _run(self, *args: str) -> None:
+        subprocess.run([self._executable, *args], check=True)
+
+
+def default_backend() -> KeyboardBackend:
+    """X11 且装有 xdotool 时使用 xdotool，否则使用 pynput。"""
+
+    if sys.platform.startswith("linux") and os.environ.get("DISPLAY"):
+        executable = shutil.which("xdotool")
+        if executable:
+            return XdotoolBackend(executable)
+    return PynputBackend()
+
+
+def _wait_until(predicate: Callable[[], bool], timeout: float) -> bool:
+    # 从 1 ms 开始指数退避轮询，条件通常在几毫秒内满足
+    deadline = time.monotonic() + timeout
+    interval = 0.001
+    while True:
+        if predicate():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+        interval = min(interval * 2, 0.016)
+
+
+class TextInserter:
+    """默认通过剪贴板粘贴；``auto`` 时不含 ASCII 字符的短文本直接模拟键入。
+
+    粘贴前轮询确认剪贴板已写入，而不是固定等待。目标应用何时读完剪贴板无从得知，
+    粘贴后由后台定时器在 ``restore_delay`` 秒后恢复原剪贴板，不占用插入路径；
+    在此之前开始下一次录音（:meth:`restore_clipboard`）或退出时立即恢复。
+    连续粘贴时沿用最初保存的剪贴板内容。
+    """
+
+    def __init__(
+        self,
+        *,
+        backend: Optional[KeyboardBackend] = None,
+        strategy: str = "auto",
+        type_max_chars: int = 16,
+        restore_delay: float = 0.3,
+        clipboard_timeout: float = 0.5,
+    ) -> None:
+        if strategy not in ("auto", "type", "paste"):
+            raise ValueError(f"不支持的插入方式: {strategy}")
+        self._backend = backend or default_backend()
+        self._strategy = strategy
+        self._type_max_chars = type_max_chars
+        self._restore_delay = restore_delay
+        self._clipboard_timeout = clipboard_timeout
+        self._lock = threading.Lock()
+        # 等待恢复的原剪贴板内容、最近一次粘贴的文本（None 表示没有待恢复的内容）及恢复定时器
+        self._saved_clipboard: Optional[str] = None
+        self._pasted: Optional[str] = None
+        self._restore_timer: Optional[threading.Timer] = None
 
     def insert(self, text: str) -> None:
         if not text:
             logger.info("文本为空，跳过填充")
             return
 
-        previous_clipboard: Optional[str] = None
+        strategy = self._choose(text)
+        started = time.monotonic()
+        with tracer.span(f"insert.{strategy}"):
+            if strategy == "type":
+                self._backend.type(text)
+            else:
+                self._paste(text)
+        logger.info(
+            "已将识别文本{}到当前输入焦点（{} 字，{:.0f} ms）",
+            "键入" if strategy == "type" else "粘贴",
+            len(text),
+            (time.monotonic() - started) * 1000,
+        )
+
+    def restore_clipboard(self) -> None:
+        """立即恢复粘贴前的剪贴板，不再等待定时器；期间用户复制了其他内容时不覆盖。
+
+        用户再次开始录音时上一次粘贴必然已完成，可在此时调用。
+        """
+
+        with self._lock:
+            self._restore_pasted_locked()
+
+    def close(self) -> None:
+        """退出前恢复尚未恢复的剪贴板。"""
+
+        self.restore_clipboard()
+
+    def _choose(self, text: str) -> str:
+        if self._strategy != "auto":
+            return self._strategy
+        # 中文输入法开启时，模拟键入的 ASCII 字母会进入输入法的候选组合，数字与标点也可能被转换，
+        # 只有不含 ASCII 字符的短文本才直接键入；换行会被键入为回车，可能直接提交表单
+        if len(text) <= self._type_max_chars and not any(char.isascii() for char in text):
+            return "type"
+        return "paste"
+
+    def _paste(self, text: str) -> None:
+        with self._lock:
+            if self._restore_timer is not None:
+                self._restore_timer.cancel()
+                self._restore_timer = None
+            try:
+                current: Optional[str] = pyperclip.paste()
+            except pyperclip.PyperclipException as exc:  # pragma: no cover - 平台差异
+                logger.debug("读取剪贴板失败: {}", exc)
+                current = None
+            # 剪贴板里仍是上一段识别结果时沿用最初保存的内容，否则（含用户新复制的内容）重新保存
+            if self._pasted is None or current != self._pasted:
+                self._saved_clipboard = current
+
+            pyperclip.copy(text)
+            if not _wait_until(lambda: pyperclip.paste() == text, self._clipboard_timeout):
+                logger.warning("剪贴板在 {:.0f} ms 内未更新，仍尝试粘贴", self._clipboard_timeout * 1000)
+            self._backend.paste()
+            # 目标应用异步读取剪贴板，立即恢复可能让它读到旧内容
+            self._pasted = text
+            timer = threading.Timer(self._restore_delay, self._restore_later)
+            timer.daemon = True
+            self._restore_timer = timer
+            timer.start()
+
+    def _restore_later(self) -> None:
+        with self._lock:
+            if self._restore_timer is not threading.current_thread():
+                # 已被新的粘贴、下一次录音或 close 接管
+                return
+            self._restore_pasted_locked()
+
+    def _restore_pasted_locked(self) -> None:
+        if self._restore_timer is not None:
+            self._restore_timer.cancel()
+            self._restore_timer = None
+        pasted, self._pasted = self._pasted, None
+        if pasted is None:
+            return
         try:
-            previous_clipboard = pyperclip.paste()
-        except pyperclip.PyperclipException as exc:  # pragma: no cover - 平台差异
-            logger.debug("读取剪贴板失败: {}", exc)
+            if pyperclip.paste() != pasted:
+                # 期间用户复制了其他内容，不再覆盖
+                self._saved_clipboard = None
+                return
+        except pyperclip.PyperclipException:  # pragma: no cover
+            return
+        self._restore_locked()
 
+    def _restore_locked(self) -> None:
+        previous, self._saved_clipboard = self._saved_clipboard, None
+        if previous is None:
+            return
         try:
-            pyperclip.copy(text)
-            time.sleep(0.05)
-            with self._keyboard.pressed(Key.cmd):
-                self._keyboard.press("v")
-                self._keyboard.release("v")
-            time.sleep(0.1)
-            logger.info("已将识别文本粘贴到当前输入焦点")
-        finally:
-            if previous_clipboard is not None:
-                try:
-                    pyperclip.copy(previous_clipboard)
-                except pyperclip.PyperclipException as exc:  # pragma: no cover
-                    logger.debug("恢复剪贴板失败: {}", exc)
+            pyperclip.copy(previous)
+        except pyperclip.PyperclipException as exc:  # pragma: no cover
+            logger.debug("恢复剪贴板失败: {}", exc)
+
+
+class IncrementalInserter:
+    """把不断被修正的识别结果以最小差异键入当前焦点。
+
+    每次更新只退格删除与已键入文本不同的后缀，再键入新的后缀。
+    """
+
+    def __init__(self, backend: Optional[KeyboardBackend] = None) -> None:
+        self._backend = backend or default_backend()
+        self._typed = ""
+        self._lock = threading.Lock()
+
+    @property
+    def typed(self) -> str:
+        return self._typed
+
+    def update(self, text: str) -> None:
+        with tracer.span("insert.incremental"), self._lock:
+            common = os.path.commonprefix([self._typed, text])
+            erase = len(self._typed) - len(common)
+            self._backend.backspace(erase)
+            suffix = text[len(common) :]
+            if suffix:
+                self._backend.type(suffix)
+            if erase or suffix:
+                logger.debug("增量更新: 删除 {} 字，键入 {!r}", erase, suffix)
+            self._typed = text
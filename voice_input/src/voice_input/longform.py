@@ -0,0 +1,104 @@
+"""长音频识别：静音处切段、多连接并行识别、按顺序拼接。
+
+讯飞单次会话最长约 60 秒，且整段识别时间随音频长度增长。切段后各段并行识别，
+总耗时接近最长一段而不是各段之和。每段结尾都会被引擎补上句号，
+拼接时按切点处的停顿长短改写边界标点。
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Union
+
+from loguru import logger
+
+from .recognizers import Recognizer
+from .telemetry import tracer
+from .vad import Segment, SilenceSegmenter
+
+# 切点处的静音（VAD 判定）不短于该值时视为句间停顿，保留句末标点
+SENTENCE_PAUSE_MILLIS = 400.0
+
+_SENTENCE_END = "。！？!?."
+_LEADING_PUNCT = "，。、；：！？,.;:!? "
+_SOFTEN = {"。": "，", ".": ","}
+
+
+def stitch(texts: Sequence[str], pauses: Sequence[Optional[float]]) -> str:
+    """按顺序拼接各段文本；``pauses[i]`` 为第 i 段与下一段之间的静音毫秒数。"""
+
+    result = ""
+    pause_before: Optional[float] = None
+    for text, pause_after in zip(texts, pauses):
+        text = text.strip()
+        if result and text:
+            # 边界标点只由前一段结尾决定
+            text = text.lstrip(_LEADING_PUNCT)
+        if not text:
+            pause_before = _longer_pause(pause_before, pause_after)
+            continue
+        if result:
+            result = _join(result, text, pause_before or 0.0)
+        else:
+            result = text
+        pause_before = pause_after
+    return result
+
+
+def _longer_pause(first: Optional[float], second: Optional[float]) -> Optional[float]:
+    # 跳过空段时，其前后两段之间的停顿至少是两侧切点中较长的那个
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return max(first, second)
+
+
+def _join(left: str, right: str, pause: float) -> str:
+    last = left[-1]
+    if pause <= 0:
+        # 在语音中强行切断，引擎补的句末标点不可信
+        left = left.rstrip(_SENTENCE_END) or left
+    elif pause < SENTENCE_PAUSE_MILLIS:
+        left = left[:-1] + _SOFTEN.get(last, last)
+    elif last not in _SENTENCE_END:
+        left += "." if last.isascii() else "。"
+
+    tail = left[-1]
+    if right[0].isascii() and right[0].isalnum() and tail.isascii() and tail != " ":
+        # 英文单词与标点后补空格
+        return f"{left} {right}"
+    return left + right
+
+
+def _frames(audio: Union[bytes, memoryview], frame_bytes: int) -> Iterator[memoryview]:
+    view = memoryview(audio)
+    return (view[start : start + frame_bytes] for start in range(0, len(view), frame_bytes))
+
+
+def recognize_long(
+    client: Recognizer,
+    audio: Union[bytes, memoryview],
+    *,
+    segmenter: Optional[SilenceSegmenter] = None,
+    max_parallel: int = 8,
+) -> str:
+    """识别任意长度的 16 kHz PCM：不超过一段时与 ``client.recognize`` 相同，否则切段并行识别。"""
+
+    segments: List[Segment] = (segmenter or SilenceSegmenter()).split(audio)
+    if len(segments) <= 1:
+        return client.recognize(_frames(audio, client.frame_bytes))
+
+    logger.info(
+        "长音频切为 {} 段并行识别，最长 {:.1f}s",
+        len(segments),
+        max(len(segment.audio) for segment in segments) / 32000,
+    )
+
+    def recognize(segment: Segment) -> str:
+        return client.recognize(_frames(segment.audio, client.frame_bytes))
+
+    with tracer.span("iat.long_audio"), ThreadPoolExecutor(
+        max_workers=min(max_parallel, len(segments)), thread_name_prefix="iat-segment"
+    ) as pool:
+        texts = list(pool.map(recognize, segments))
+    return stitch(texts, [segment.pause_after_millis for segment in segments])
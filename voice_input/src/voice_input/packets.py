@@ -0,0 +1,71 @@
+"""听写数据帧编码。"""
+from __future__ import annotations
+
+import json
+from binascii import b2a_base64
+from typing import Dict, Tuple, Union
+
+AudioBytes = Union[bytes, bytearray, memoryview]
+
+# 16 kHz、16 bit 单声道下 40 ms 的字节数，与录音回调的块大小一致
+FRAME_BYTES_PER_40MS = 1280
+
+
+def frame_bytes_for(frame_millis: int) -> int:
+    """按 40 ms 的整数倍计算每帧音频字节数。"""
+
+    if frame_millis <= 0 or frame_millis % 40:
+        raise ValueError("frame_millis 必须是 40 的正整数倍")
+    return FRAME_BYTES_PER_40MS * (frame_millis // 40)
+
+
+def _b64_length(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+class IatFrameEncoder:
+    """预编译的听写数据帧编码器。
+
+    固定字段（format、encoding、common、business）在构造时一次性序列化为字节模板，
+    编码时只做 base64 与拼接。满长的中间帧直接写入复用的缓冲区，
+    因此返回值只在下一次 ``encode`` 之前有效，每个连接应使用独立的编码器。
+    """
+
+    def __init__(
+        self,
+        *,
+        app_id: str,
+        business: Dict[str, object],
+        audio_format: str = "audio/L16;rate=16000",
+        encoding: str = "raw",
+        frame_bytes: int = FRAME_BYTES_PER_40MS,
+    ) -> None:
+        fields = f'"format":{json.dumps(audio_format)},"encoding":{json.dumps(encoding)}'
+        meta = f'"common":{json.dumps({"app_id": app_id})},"business":{json.dumps(business)},'
+        self._prefixes: Dict[Tuple[int, bool], bytes] = {
+            (status, include_meta): (
+                f'{{{meta if include_meta else ""}"data":{{"status":{status},{fields},"audio":"'
+            ).encode("utf-8")
+            for status in (0, 1, 2)
+            for include_meta in (False, True)
+        }
+        self._suffix = b'"}}'
+        self._frame_bytes = frame_bytes
+
+        head = self._prefixes[(1, False)]
+        audio_length = _b64_length(frame_bytes)
+        self._frame = bytearray(head + b"A" * audio_length + self._suffix)
+        self._audio_slot = slice(len(head), len(head) + audio_length)
+
+    @property
+    def frame_bytes(self) -> int:
+        return self._frame_bytes
+
+    def encode(self, audio: AudioBytes, *, status: int, include_meta: bool = False) -> Union[bytes, bytearray]:
+        """编码一帧，返回可直接作为文本帧发送的 UTF-8 字节。"""
+
+        if status == 1 and not include_meta and len(audio) == self._frame_bytes:
+            # 等长切片赋值是原地拷贝，不会重新分配缓冲区
+            self._frame[self._audio_slot] = b2a_base64(audio, newline=False)
+            return self._frame
+        return b"".join((self._prefixes[(status, include_meta)], b2a_base64(audio, newline=False), self._suffix))
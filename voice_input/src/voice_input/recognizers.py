@@ -0,0 +1,170 @@
+"""识别后端：讯飞在线听写之外的本地离线引擎，以及两者竞速。
+
+所有后端都实现 :class:`Recognizer` 的 ``recognize``：接收 16 kHz、16 bit 单声道 PCM 分块，
+返回整段文本。讯飞客户端 :class:`~.speech_client.XFYunIatClient` 即是其中之一。
+"""
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Union
+
+from loguru import logger
+
+from .telemetry import tracer
+
+AudioChunk = Union[bytes, memoryview]
+
+# 中文模型按词输出并以空格分隔，汉字之间的空格需要去掉
+_CJK_SPACE = re.compile(r"(?<=[\u3000-\u9fff\uff00-\uffef])\s+(?=[\u3000-\u9fff\uff00-\uffef])")
+
+RECOGNIZERS = ("xfyun", "vosk", "race")
+
+
+class RecognizerUnavailableError(RuntimeError):
+    """所选识别后端依赖的库或模型不可用。"""
+
+
+class Recognizer(ABC):
+    """识别后端基类。"""
+
+    name = ""
+
+    @abstractmethod
+    def recognize(self, audio_chunks: Iterable[AudioChunk]) -> str:
+        """识别整段音频并返回文本。"""
+
+    @property
+    def frame_bytes(self) -> int:
+        """建议的分块字节数，默认 40 ms。"""
+
+        return 1280
+
+
+class VoskRecognizer(Recognizer):
+    """基于 Vosk（Kaldi）的本地离线识别，只用 CPU，不需要网络与讯飞凭据。
+
+    依赖可选包 ``vosk`` 与一个模型目录（如 ``vosk-model-small-cn-0.22``，约 40 MB）。
+    模型只加载一次并在各线程间共享，每次识别新建一个解码器。
+    """
+
+    name = "vosk"
+
+    def __init__(self, model_path: Union[str, Path], *, samplerate: int = 16000) -> None:
+        try:
+            import vosk
+        except ImportError as exc:
+            raise RecognizerUnavailableError("本地识别需要安装 vosk：pip install vosk") from exc
+        path = Path(model_path).expanduser()
+        if not path.is_dir():
+            raise RecognizerUnavailableError(f"找不到 Vosk 模型目录: {path}")
+
+        vosk.SetLogLevel(-1)
+        started = time.monotonic()
+        self._vosk = vosk
+        self._model = vosk.Model(str(path))
+        self._samplerate = samplerate
+        logger.info("已加载本地识别模型 {}（{:.1f}s）", path.name, time.monotonic() - started)
+
+    def recognize(self, audio_chunks: Iterable[AudioChunk]) -> str:
+        decoder = self._vosk.KaldiRecognizer(self._model, self._samplerate)
+        sentences: List[str] = []
+        with tracer.span("local.recognize"):
+            for chunk in audio_chunks:
+                if decoder.AcceptWaveform(bytes(chunk)):
+                    sentences.append(json.loads(decoder.Result()).get("text", ""))
+            sentences.append(json.loads(decoder.FinalResult()).get("text", ""))
+        return _CJK_SPACE.sub("", " ".join(sentence for sentence in sentences if sentence))
+
+
+class RacingRecognizer(Recognizer):
+    """把同一段音频同时交给主后端（讯飞）与备用后端（本地引擎），取先得到的有效结果。
+
+    ``primary_budget`` 秒内主后端给出非空结果时总是采用它；超过预算后谁先给出非空结果就用谁，
+    一方报错时直接等待另一方。设为 0 即纯竞速。落败的一方停止送入音频，其结果被丢弃。
+    """
+
+    name = "race"
+
+    def __init__(self, primary: Recognizer, fallback: Recognizer, *, primary_budget: float = 1.0) -> None:
+        self._primary = primary
+        self._fallback = fallback
+        self._primary_budget = primary_budget
+
+    @property
+    def frame_bytes(self) -> int:
+        return self._primary.frame_bytes
+
+    def recognize(self, audio_chunks: Iterable[AudioChunk]) -> str:
+        # 两个后端各自迭代同一组分块，分块本身是零拷贝视图
+        chunks = list(audio_chunks)
+        started = time.monotonic()
+        contenders = [self._primary, self._fallback]
+        stops = [threading.Event() for _ in contenders]
+        futures = [self._spawn(recognizer, chunks, stop) for recognizer, stop in zip(contenders, stops)]
+
+        with tracer.span("race.recognize"):
+            winner = self._pick(futures)
+        for index, stop in enumerate(stops):
+            if index != winner:
+                stop.set()
+
+        if winner is None:
+            # 两方都没有给出非空结果：优先抛出主后端的错误，否则返回空文本
+            for future in futures:
+                if future.exception() is not None:
+                    raise future.exception()
+            return ""
+        logger.info(
+            "竞速识别采用 {} 的结果（{:.0f} ms）",
+            contenders[winner].name,
+            (time.monotonic() - started) * 1000,
+        )
+        return futures[winner].result()
+
+    def _pick(self, futures: Sequence[Future]) -> Optional[int]:
+        primary = futures[0]
+        wait([primary], timeout=self._primary_budget)
+        if _accepted(primary):
+            return 0
+
+        pending = {future for future in futures if not future.done()}
+        while True:
+            for index, future in enumerate(futures):
+                if _accepted(future):
+                    return index
+            if not pending:
+                return None
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    @staticmethod
+    def _spawn(recognizer: Recognizer, chunks: Sequence[AudioChunk], stop: threading.Event) -> Future:
+        future: Future = Future()
+
+        def run() -> None:
+            try:
+                future.set_result(recognizer.recognize(_until(chunks, stop)))
+            except BaseException as exc:
+                logger.debug("{} 识别失败: {}", recognizer.name, exc)
+                future.set_exception(exc)
+
+        # 独立的守护线程：落败方（如网络不可达时的讯飞）可能仍阻塞在超时上，不应占用共享线程池
+        threading.Thread(target=run, name=f"race-{recognizer.name}", daemon=True).start()
+        return future
+
+
+def _accepted(future: Future) -> bool:
+    return future.done() and future.exception() is None and bool(future.result().strip())
+
+
+def _until(chunks: Sequence[AudioChunk], stop: threading.Event) -> Iterator[AudioChunk]:
+    for chunk in chunks:
+        if stop.is_set():
+            return
+        yield chunk
+
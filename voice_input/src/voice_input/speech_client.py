@@ -3,12 +3,15 @@ from __future__ import annotations
 
 import base64
 import json
+import queue
 import ssl
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, replace
 from datetime import datetime
 from email.utils import formatdate
-from typing import Dict, Iterable, List, Optional
-from urllib.parse import quote
+from typing import Callable, Dict, Iterable, List, Optional, Union
+from urllib.parse import quote, urlsplit
 import hmac
 import hashlib
 
@@ -16,6 +19,10 @@ from loguru import logger
 from websocket import WebSocketConnectionClosedException, create_connection
 
 from .config import XFYunCredentials
+from .encoders import AudioEncoder, create_encoder
+from .packets import IatFrameEncoder, frame_bytes_for
+from .recognizers import Recognizer
+from .telemetry import tracer
 
 
 _XFYUN_HOST = "iat-api.xfyun.cn"
@@ -33,61 +40,168 @@ class IatBusinessConfig:
     domain: str = "iat"
     accent: str = "mandarin"
     vad_eos: int = 3000
+    # "wpgs" 开启动态修正，服务端会返回带 pgs/rg 的中间结果
+    dwa: Optional[str] = None
+    # 会话级热词，格式 "utf-8;词1|词2"，见 hot_words_param
+    dhw: Optional[str] = None
 
     def to_dict(self) -> Dict[str, object]:
-        return {
+        business: Dict[str, object] = {
             "language": self.language,
             "domain": self.domain,
             "accent": self.accent,
             "vad_eos": self.vad_eos,
         }
+        if self.dwa:
+            business["dwa"] = self.dwa
+        if self.dhw:
+            business["dhw"] = self.dhw
+        return business
 
 
-class XFYunIatClient:
+def hot_words_param(words: Iterable[str]) -> Optional[str]:
+    """把热词拼成 ``dhw`` 参数；含分隔符的词条无法表达，直接跳过。"""
+
+    usable = [word for word in words if word and "|" not in word and ";" not in word]
+    return f"utf-8;{'|'.join(usable)}" if usable else None
+
+
+class XFYunIatClient(Recognizer):
     """简化的实时语音听写客户端。"""
 
+    name = "xfyun"
+
     def __init__(
         self,
         credentials: XFYunCredentials,
         *,
         business: Optional[IatBusinessConfig] = None,
         timeout: float = 10.0,
+        preconnect_ttl: float = 8.0,
+        frame_millis: int = 40,
+        audio_encoding: str = "raw",
+        url: str = _XFYUN_URL,
     ) -> None:
+        """``url`` 默认指向讯飞听写服务，可改为本地替身服务（如 ``ws://127.0.0.1:8765/v2/iat``）。
+
+        ``audio_encoding`` 为上传前的压缩方式：raw、speex-wb 或 lame，见 :mod:`encoders`。
+        """
+
         self._credentials = credentials
         self._business = business or IatBusinessConfig()
         self._timeout = timeout
+        parsed = urlsplit(url)
+        self._url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+        self._host = parsed.netloc
+        self._endpoint = parsed.path or "/"
+        # 整段上传时每帧的音频时长，需为录音块 40 ms 的整数倍
+        self._frame_bytes = frame_bytes_for(frame_millis)
+        # 先创建一次，依赖缺失时在构造阶段即报错
+        create_encoder(audio_encoding)
+        self._audio_encoding = audio_encoding
+        # 讯飞在连接建立后约 10 秒未收到音频即断开，预建连接需在此之前轮换
+        self._preconnect_ttl = preconnect_ttl
+        self._preconnector: Optional[_Preconnector] = None
+        self._preconnect_lock = threading.Lock()
 
-    def recognize(self, audio_chunks: Iterable[bytes]) -> str:
+    def recognize(self, audio_chunks: Iterable[Union[bytes, memoryview]]) -> str:
         """将 PCM 音频分段发送到讯飞听写服务并返回识别结果。"""
 
-        url = self._construct_url()
-        logger.debug("连接讯飞听写服务: {}", url)
-        ws = create_connection(url, timeout=self._timeout, sslopt={"cert_reqs": ssl.CERT_NONE})
+        ws = self._connect()
 
         try:
-            first_packet = True
+            timeline = _Timeline()
+            writer = self._new_writer()
             for chunk in audio_chunks:
-                if not chunk:
+                packet = writer.packet(chunk)
+                if packet is None:
                     continue
-                payload = self._make_data_packet(chunk, status=0 if first_packet else 1, include_meta=first_packet)
-                ws.send(payload)
-                first_packet = False
+                ws.send(packet)
+                if timeline.first_sent is None:
+                    timeline.first_sent = time.monotonic()
 
-            # 发送结束包
-            ws.send(self._make_data_packet(b"", status=2, include_meta=False))
+            # 发送编码器剩余数据与结束包
+            for packet in writer.closing():
+                ws.send(packet)
+            timeline.end_sent = time.monotonic()
 
-            return self._collect_result(ws)
+            accumulator = _ResultAccumulator()
+            self._collect_result(ws, accumulator)
+            timeline.trace(accumulator)
+            return accumulator.text()
         finally:
             try:
                 ws.close()
             except WebSocketConnectionClosedException:
                 pass
 
+    @property
+    def frame_bytes(self) -> int:
+        return self._frame_bytes
+
+    def set_hot_words(self, words: Iterable[str]) -> None:
+        """更新会话级热词（业务参数 ``dhw``），对之后新建的会话生效。"""
+
+        self._business = replace(self._business, dhw=hot_words_param(words))
+
+    def open_session(self, *, on_partial: Optional[Callable[[str], None]] = None) -> "IatStreamingSession":
+        """创建并启动一个边录音边上传的流式会话。
+
+        ``on_partial`` 会在每次收到结果时以当前完整文本回调（在接收线程中执行）。
+        """
+
+        session = IatStreamingSession(self, on_partial=on_partial)
+        session.start()
+        return session
+
+    def preconnect(self, *, max_lifetime: float = 120.0) -> None:
+        """在后台提前完成 URL 签名与 TLS/WebSocket 握手，供下一次识别直接使用。
+
+        未被使用的连接会在服务端空闲超时前关闭并重新握手，最长维持 ``max_lifetime`` 秒。
+        """
+
+        preconnector = _Preconnector(
+            self._open_connection,
+            idle_ttl=self._preconnect_ttl,
+            max_lifetime=max_lifetime,
+        )
+        with self._preconnect_lock:
+            previous, self._preconnector = self._preconnector, preconnector
+        if previous is not None:
+            previous.discard()
+        preconnector.start()
+
+    def discard_preconnected(self) -> None:
+        """丢弃尚未使用的预建连接。"""
+
+        with self._preconnect_lock:
+            preconnector, self._preconnector = self._preconnector, None
+        if preconnector is not None:
+            preconnector.discard()
+
+    def _connect(self):
+        with self._preconnect_lock:
+            preconnector, self._preconnector = self._preconnector, None
+        if preconnector is not None:
+            with tracer.span("iat.preconnect_claim"):
+                ws = preconnector.claim(self._timeout)
+            if ws is not None:
+                logger.debug("使用预建的讯飞连接")
+                return ws
+        return self._open_connection()
+
+    def _open_connection(self):
+        with tracer.span("iat.sign_url"):
+            url = self._construct_url()
+        logger.debug("连接讯飞听写服务: {}", url)
+        with tracer.span("iat.connect"):
+            return create_connection(url, timeout=self._timeout, sslopt={"cert_reqs": ssl.CERT_NONE})
+
     def _construct_url(self) -> str:
         """构造带鉴权参数的 WebSocket URL。"""
 
         date = formatdate(timeval=None, localtime=False, usegmt=True)
-        signature_text = f"host: {_XFYUN_HOST}\ndate: {date}\nGET {_XFYUN_ENDPOINT} HTTP/1.1"
+        signature_text = f"host: {self._host}\ndate: {date}\nGET {self._endpoint} HTTP/1.1"
         signature = hmac.new(
             self._credentials.api_secret.encode("utf-8"),
             signature_text.encode("utf-8"),
@@ -102,25 +216,21 @@ class XFYunIatClient:
         )
         authorization = base64.b64encode(authorization_origin.encode("utf-8")).decode("utf-8")
 
-        return f"{_XFYUN_URL}?authorization={authorization}&date={quote(date)}&host={_XFYUN_HOST}"
-
-    def _make_data_packet(self, audio: bytes, *, status: int, include_meta: bool) -> str:
-        data = {
-            "status": status,
-            "audio": base64.b64encode(audio).decode("utf-8"),
-            "format": "audio/L16;rate=16000",
-            "encoding": "raw",
-        }
-        payload = {"data": data}
-        if include_meta:
-            payload["common"] = {"app_id": self._credentials.app_id}
-            payload["business"] = self._business.to_dict()
-        return json.dumps(payload)
+        return f"{self._url}?authorization={authorization}&date={quote(date)}&host={self._host}"
 
-    def _collect_result(self, ws) -> str:
-        accumulated: Dict[int, str] = {}
-        final_status = None
+    def _new_writer(self) -> _PacketWriter:
+        # 编码器有状态且复用内部缓冲区，每个连接单独创建
+        audio_encoder = create_encoder(self._audio_encoding)
+        frames = IatFrameEncoder(
+            app_id=self._credentials.app_id,
+            business=self._business.to_dict(),
+            audio_format=audio_encoder.audio_format,
+            encoding=audio_encoder.encoding,
+            frame_bytes=self._frame_bytes,
+        )
+        return _PacketWriter(audio_encoder, frames)
 
+    def _collect_result(self, ws, accumulator: _ResultAccumulator) -> None:
         while True:
             try:
                 raw_message = ws.recv()
@@ -130,37 +240,208 @@ class XFYunIatClient:
             if not raw_message:
                 break
 
-            response = json.loads(raw_message)
-            logger.debug("收到讯飞消息: {}", response)
-            code = response.get("code", -1)
-            if code != 0:
-                message = response.get("message", "未知错误")
-                raise XFYunAPIError(f"讯飞接口返回错误: {code} {message}")
-
-            data = response.get("data") or {}
-            final_status = data.get("status", final_status)
-            result = data.get("result")
-            if result:
-                text = self._parse_result_segment(result)
-                sn = result.get("sn")
-                if sn is None:
-                    # 若未提供 sn，则退化为简单追加
-                    sn = max(accumulated.keys(), default=-1) + 1
-                pgs = result.get("pgs")
-                if pgs == "rpl":
-                    rg = result.get("rg") or []
-                    if isinstance(rg, list) and len(rg) == 2:
-                        start, end = rg
-                        for key in list(accumulated.keys()):
-                            if start <= key <= end:
-                                accumulated.pop(key, None)
-                accumulated[sn] = text
-
-            if final_status == 2:
+            if accumulator.feed(json.loads(raw_message)):
                 break
 
-        ordered_keys = sorted(accumulated.keys())
-        return "".join(accumulated[key] for key in ordered_keys)
+
+class _Preconnector:
+    """后台预建一条 WebSocket 连接，并在空闲超时前轮换。"""
+
+    def __init__(self, connect: Callable[[], object], *, idle_ttl: float, max_lifetime: float) -> None:
+        self._connect = connect
+        self._idle_ttl = idle_ttl
+        self._deadline = time.monotonic() + max_lifetime
+        self._cond = threading.Condition()
+        self._ws = None
+        self._connecting = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="iat-preconnect", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def claim(self, wait: float):
+        """取走已就绪的连接；握手仍在进行时最多等待 ``wait`` 秒。"""
+
+        deadline = time.monotonic() + wait
+        with self._cond:
+            while self._ws is None and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not (self._connecting or self._thread.is_alive()):
+                    break
+                self._cond.wait(remaining)
+            ws, self._ws = self._ws, None
+            self._closed = True
+            self._cond.notify_all()
+        return ws
+
+    def discard(self) -> None:
+        with self._cond:
+            ws, self._ws = self._ws, None
+            self._closed = True
+            self._cond.notify_all()
+        _close_quietly(ws)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed or time.monotonic() >= self._deadline:
+                    self._closed = True
+                    self._cond.notify_all()
+                    return
+                self._connecting = True
+
+            try:
+                ws = self._connect()
+            except Exception as exc:
+                logger.warning("预建讯飞连接失败，识别时将重新连接: {}", exc)
+                with self._cond:
+                    self._connecting = False
+                    self._closed = True
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._connecting = False
+                if self._closed:
+                    expired = ws
+                else:
+                    self._ws = ws
+                    self._cond.notify_all()
+                    expires_at = time.monotonic() + self._idle_ttl
+                    while self._ws is ws and not self._closed:
+                        remaining = expires_at - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    if self._ws is not ws:
+                        # 已被取走或丢弃
+                        return
+                    self._ws = None
+                    expired = ws
+
+            _close_quietly(expired)
+            if self._closed:
+                return
+            logger.debug("预建连接即将空闲超时，重新握手")
+
+
+def _close_quietly(ws) -> None:
+    if ws is None:
+        return
+    try:
+        ws.close()
+    except Exception:  # 连接可能已被服务端关闭
+        pass
+
+
+class _PacketWriter:
+    """把 PCM 块依次压缩并封装为数据帧，负责首帧元信息与结束包。"""
+
+    __slots__ = ("_audio", "_frames", "_first")
+
+    def __init__(self, audio: AudioEncoder, frames: IatFrameEncoder) -> None:
+        self._audio = audio
+        self._frames = frames
+        self._first = True
+
+    def packet(self, chunk) -> Optional[Union[bytes, bytearray]]:
+        """返回下一帧；编码器仍在缓冲（或块为空）时返回 ``None``。"""
+
+        if not chunk:
+            return None
+        encoded = self._audio.encode(chunk)
+        if not encoded:
+            return None
+        return self._next(encoded)
+
+    def closing(self) -> List[Union[bytes, bytearray]]:
+        """编码器剩余数据（如有）加上 status=2 的结束包。"""
+
+        packets = []
+        tail = self._audio.flush()
+        if tail:
+            packets.append(self._next(tail))
+        packets.append(self._frames.encode(b"", status=2, include_meta=self._first))
+        return packets
+
+    def _next(self, encoded) -> Union[bytes, bytearray]:
+        first, self._first = self._first, False
+        return self._frames.encode(encoded, status=0 if first else 1, include_meta=first)
+
+
+class _Timeline:
+    """单次会话的关键时间点（单调时钟），用于延迟埋点。"""
+
+    __slots__ = ("connected", "first_sent", "end_sent")
+
+    def __init__(self) -> None:
+        self.connected = time.monotonic()
+        self.first_sent: Optional[float] = None
+        self.end_sent: Optional[float] = None
+
+    def trace(self, accumulator: "_ResultAccumulator") -> None:
+        if not tracer.enabled:
+            return
+        if self.first_sent is not None:
+            tracer.record("iat.first_packet", self.first_sent - self.connected)
+            if accumulator.first_result_at is not None:
+                tracer.record("iat.first_result", accumulator.first_result_at - self.first_sent)
+        if self.end_sent is not None and accumulator.final_at is not None:
+            tracer.record("iat.final_result", accumulator.final_at - self.end_sent)
+
+
+class _ResultAccumulator:
+    """按 sn 汇总听写结果，并处理 pgs/rg 动态修正。"""
+
+    def __init__(self, on_update: Optional[Callable[[str], None]] = None) -> None:
+        self._accumulated: Dict[int, str] = {}
+        self._final_status: Optional[int] = None
+        self._on_update = on_update
+        self.first_result_at: Optional[float] = None
+        self.final_at: Optional[float] = None
+
+    def feed(self, response: Dict[str, object]) -> bool:
+        """处理一条服务端消息，返回是否已收到最终结果。"""
+
+        logger.debug("收到讯飞消息: {}", response)
+        code = response.get("code", -1)
+        if code != 0:
+            message = response.get("message", "未知错误")
+            raise XFYunAPIError(f"讯飞接口返回错误: {code} {message}")
+
+        accumulated = self._accumulated
+        data = response.get("data") or {}
+        self._final_status = data.get("status", self._final_status)
+        result = data.get("result")
+        if result:
+            if self.first_result_at is None:
+                self.first_result_at = time.monotonic()
+            text = self._parse_result_segment(result)
+            sn = result.get("sn")
+            if sn is None:
+                # 若未提供 sn，则退化为简单追加
+                sn = max(accumulated.keys(), default=-1) + 1
+            pgs = result.get("pgs")
+            if pgs == "rpl":
+                rg = result.get("rg") or []
+                if isinstance(rg, list) and len(rg) == 2:
+                    start, end = rg
+                    for key in list(accumulated.keys()):
+                        if start <= key <= end:
+                            accumulated.pop(key, None)
+            accumulated[sn] = text
+            if self._on_update is not None:
+                self._on_update(self.text())
+
+        if self._final_status == 2:
+            self.final_at = time.monotonic()
+            return True
+        return False
+
+    def text(self) -> str:
+        ordered_keys = sorted(self._accumulated.keys())
+        return "".join(self._accumulated[key] for key in ordered_keys)
 
     @staticmethod
     def _parse_result_segment(result: Dict[str, object]) -> str:
@@ -171,3 +452,104 @@ class XFYunIatClient:
                 if text:
                     words.append(text)
         return "".join(words)
+
+
+class IatStreamingSession:
+    """边录音边上传的听写会话。
+
+    ``feed`` 只负责入队，可直接在录音回调线程中调用；建连、发送与接收均在后台线程完成，
+    结束录音后 ``finish`` 只需等待结束包和最后一批结果。
+    """
+
+    def __init__(self, client: XFYunIatClient, *, on_partial: Optional[Callable[[str], None]] = None) -> None:
+        self._client = client
+        self._queue: "queue.Queue[Optional[Union[bytes, memoryview]]]" = queue.Queue()
+        self._accumulator = _ResultAccumulator(on_partial)
+        self._error: Optional[BaseException] = None
+        self._ws = None
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, name="iat-session", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def feed(self, chunk: Union[bytes, memoryview]) -> None:
+        if chunk and not self._cancelled:
+            self._queue.put(chunk)
+
+    def finish(self, timeout: Optional[float] = None) -> str:
+        """发送结束包并等待最终识别结果。"""
+
+        self._queue.put(None)
+        self._thread.join(timeout if timeout is not None else self._client._timeout * 3)
+        if self._thread.is_alive():
+            self.cancel()
+            raise XFYunAPIError("等待讯飞识别结果超时")
+        if self._error is not None:
+            raise self._error
+        return self._accumulator.text()
+
+    def cancel(self) -> None:
+        """放弃本次会话并关闭连接。"""
+
+        self._cancelled = True
+        self._queue.put(None)
+        self._close()
+
+    def _run(self) -> None:
+        try:
+            self._ws = ws = self._client._connect()
+            if self._cancelled:
+                return
+            receiver = threading.Thread(target=self._receive, args=(ws,), name="iat-receiver", daemon=True)
+            receiver.start()
+
+            timeline = _Timeline()
+            writer = self._client._new_writer()
+            while True:
+                chunk = self._queue.get()
+                if chunk is None or self._cancelled:
+                    break
+                packet = writer.packet(chunk)
+                if packet is None:
+                    continue
+                ws.send(packet)
+                if timeline.first_sent is None:
+                    timeline.first_sent = time.monotonic()
+
+            if not self._cancelled:
+                # 发送编码器剩余数据与结束包
+                for packet in writer.closing():
+                    ws.send(packet)
+                timeline.end_sent = time.monotonic()
+                receiver.join()
+                timeline.trace(self._accumulator)
+        except Exception as exc:  # 交由 finish 抛出
+            if not self._cancelled and self._error is None:
+                self._error = exc
+        finally:
+            self._close()
+
+    def _receive(self, ws) -> None:
+        try:
+            while True:
+                try:
+                    raw_message = ws.recv()
+                except WebSocketConnectionClosedException:
+                    break
+                if not raw_message:
+                    break
+                if self._accumulator.feed(json.loads(raw_message)):
+                    break
+        except Exception as exc:  # 交由 finish 抛出
+            if not self._cancelled and self._error is None:
+                self._error = exc
+
+    def _close(self) -> None:
+        ws = self._ws
+        if ws is None:
+            return
+        try:
+            ws.close()
+        except WebSocketConnectionClosedException:
+            pass
@@ -0,0 +1,290 @@
+"""本地讯飞听写替身服务。
+
+实现 v2 IAT 的 WebSocket 帧格式：首帧 common/business、status 0/1/2、
+按 sn 递增返回结果，开启 ``dwa=wpgs`` 时返回 pgs/rg 动态修正；
+可配置服务端延迟与错误注入，用于在没有真实 ``iat-api.xfyun.cn`` 时验证客户端。
+
+    python3 -m src.voice_input.stub_server --port 8765 --latency-ms 30 --error-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+from loguru import logger
+
+# 替身“识别”结果：按收到的音频时长依次输出这些字
+_SCRIPT = "今天天气很好我们一起去公园散步然后吃午饭"
+_BYTES_PER_SECOND = 16000 * 2
+# MPEG-2 Layer III 的码率表（kbps），16 kHz 时每帧 576 个采样即 36 ms
+_MP3_BITRATES = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+
+
+@dataclass
+class StubConfig:
+    # 每条结果返回前的额外延迟
+    latency_ms: float = 0.0
+    # 收到结束包后、返回最终结果前的额外延迟
+    final_latency_ms: float = 0.0
+    # 握手阶段的额外延迟
+    connect_latency_ms: float = 0.0
+    # 每收到多少毫秒音频输出一个字
+    ms_per_word: int = 200
+    # 每个会话以该概率在中途返回错误码
+    error_rate: float = 0.0
+    # 每个会话以该概率在中途直接断开连接
+    drop_rate: float = 0.0
+    # 连接后多久未收到数据即断开，与线上一致约 10 秒
+    idle_timeout: float = 10.0
+    # 单次会话允许的最长音频
+    max_audio_seconds: float = 60.0
+    seed: Optional[int] = None
+
+
+class IatStubServer:
+    """asyncio 实现的听写替身服务。"""
+
+    def __init__(self, config: Optional[StubConfig] = None, *, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._config = config or StubConfig()
+        self._host = host
+        self._port = port
+        self._random = random.Random(self._config.seed)
+        self._server = None
+        self.sessions = 0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self._host}:{self._port}/v2/iat"
+
+    async def start(self) -> None:
+        self._server = await websockets.serve(
+            self._handle,
+            self._host,
+            self._port,
+            process_request=self._process_request,
+            # 报错返回后不再读取剩余数据帧；有界队列会暂停读取，客户端的关闭帧要等到超时才被处理
+            max_queue=None,
+        )
+        self._port = self._server.sockets[0].getsockname()[1]
+        logger.info("听写替身服务已启动: {}", self.url)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def _process_request(self, connection, request):
+        if self._config.connect_latency_ms:
+            await asyncio.sleep(self._config.connect_latency_ms / 1000)
+        query = parse_qs(urlsplit(request.path).query)
+        if not all(key in query for key in ("authorization", "date", "host")):
+            return connection.respond(401, "missing authorization\n")
+        return None
+
+    async def _handle(self, ws) -> None:
+        self.sessions += 1
+        config = self._config
+        session = _StubSession(config, dynamic=False)
+        fail_at = self._pick_failure_point()
+
+        while True:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), config.idle_timeout)
+            except asyncio.TimeoutError:
+                await self._send_error(ws, 10114, "session timeout", session.sid)
+                return
+            except websockets.ConnectionClosed:
+                return
+
+            try:
+                frame = json.loads(raw)
+                data = frame["data"]
+                status = int(data["status"])
+                audio = base64.b64decode(data.get("audio", ""), validate=True)
+            except (ValueError, KeyError, TypeError, binascii.Error):
+                await self._send_error(ws, 10160, "parse request json error", session.sid)
+                return
+
+            if session.frames == 0:
+                if status != 0 or "common" not in frame or "business" not in frame:
+                    await self._send_error(ws, 10165, "invalid handle", session.sid)
+                    return
+                session.dynamic = frame["business"].get("dwa") == "wpgs"
+                session.encoding = str(data.get("encoding", "raw")).split(";")[0]
+            elif status == 0:
+                await self._send_error(ws, 10165, "invalid handle", session.sid)
+                return
+
+            session.frames += 1
+            session.add_audio(audio)
+            if session.audio_millis > config.max_audio_seconds * 1000:
+                await self._send_error(ws, 10114, "audio exceeds session limit", session.sid)
+                return
+
+            if fail_at is not None and session.frames >= fail_at[1]:
+                if fail_at[0] == "drop":
+                    await ws.close()
+                else:
+                    await self._send_error(ws, 10700, "engine error (injected)", session.sid)
+                return
+
+            for result in session.advance(final=status == 2):
+                if config.latency_ms:
+                    await asyncio.sleep(config.latency_ms / 1000)
+                await ws.send(json.dumps(result))
+
+            if status == 2:
+                if config.final_latency_ms:
+                    await asyncio.sleep(config.final_latency_ms / 1000)
+                await ws.send(json.dumps(session.final_message()))
+                return
+
+    def _pick_failure_point(self):
+        roll = self._random.random()
+        if roll < self._config.error_rate:
+            kind = "error"
+        elif roll < self._config.error_rate + self._config.drop_rate:
+            kind = "drop"
+        else:
+            return None
+        return kind, self._random.randint(1, 20)
+
+    @staticmethod
+    async def _send_error(ws, code: int, message: str, sid: str) -> None:
+        try:
+            await ws.send(json.dumps({"code": code, "message": message, "sid": sid}))
+        except websockets.ConnectionClosed:
+            pass
+
+
+class _StubSession:
+    _counter = 0
+
+    def __init__(self, config: StubConfig, *, dynamic: bool) -> None:
+        _StubSession._counter += 1
+        self.sid = f"iat-stub-{_StubSession._counter:06d}"
+        self.dynamic = dynamic
+        self.frames = 0
+        self.encoding = "raw"
+        self.audio_millis = 0.0
+        # 压缩音频未解析完的尾部
+        self._pending = bytearray()
+        self._config = config
+        self._words_sent = 0
+        self._sn = 0
+        # sn -> 文本，用于构造 rpl 修正
+        self._segments: Dict[int, str] = {}
+
+    def add_audio(self, audio: bytes) -> None:
+        """按编码估算音频时长：speex-wb 每帧 20 ms，lame 按 mp3 帧头计算。"""
+
+        if self.encoding == "raw":
+            self.audio_millis += len(audio) * 1000 / _BYTES_PER_SECOND
+            return
+        self._pending += audio
+        offset = 0
+        while offset < len(self._pending):
+            frame = self._compressed_frame(offset)
+            if frame is None:
+                break
+            size, millis = frame
+            offset += size
+            self.audio_millis += millis
+        del self._pending[:offset]
+
+    def _compressed_frame(self, offset: int) -> Optional[Tuple[int, int]]:
+        # 返回 (帧字节数, 帧时长)；数据不足一帧时返回 None，mp3 帧头不合法时跳过 1 字节
+        pending = self._pending
+        if self.encoding.startswith("speex"):
+            # 讯飞定制格式：1 字节帧长 + 帧数据
+            size = 1 + pending[offset]
+            return (size, 20) if offset + size <= len(pending) else None
+        if offset + 3 > len(pending):
+            return None
+        header = pending[offset + 2]
+        index = header >> 4
+        if pending[offset] != 0xFF or pending[offset + 1] & 0xE0 != 0xE0 or not 0 < index < len(_MP3_BITRATES):
+            return 1, 0
+        size = 72000 * _MP3_BITRATES[index] // 16000 + (header >> 1 & 1)
+        return (size, 36) if offset + size <= len(pending) else None
+
+    def advance(self, *, final: bool) -> List[Dict[str, object]]:
+        """根据已收到的音频时长生成新的中间结果。"""
+
+        due = int(self.audio_millis // self._config.ms_per_word)
+        messages = []
+        while self._words_sent < due:
+            word = _SCRIPT[self._words_sent % len(_SCRIPT)]
+            self._words_sent += 1
+            if self.dynamic and self._sn >= 2 and self._words_sent % 4 == 0:
+                # 每 4 个字把最近两段合并为一段，模拟动态修正
+                start = self._sn - 1
+                merged = self._segments.pop(self._sn - 1) + self._segments.pop(self._sn) + word
+                self._sn += 1
+                self._segments[self._sn] = merged
+                messages.append(self._message(1, merged, pgs="rpl", rg=[start, self._sn - 1]))
+            else:
+                self._sn += 1
+                self._segments[self._sn] = word
+                messages.append(self._message(1, word, pgs="apd" if self.dynamic else None))
+        return messages
+
+    def final_message(self) -> Dict[str, object]:
+        self._sn += 1
+        return self._message(2, "。", pgs="apd" if self.dynamic else None, last=True)
+
+    def _message(self, status: int, text: str, *, pgs: Optional[str] = None, rg=None, last: bool = False):
+        result: Dict[str, object] = {
+            "sn": self._sn,
+            "ls": last,
+            "ws": [{"bg": 0, "cw": [{"sc": 0, "w": text}]}],
+        }
+        if pgs:
+            result["pgs"] = pgs
+        if rg:
+            result["rg"] = rg
+        return {"code": 0, "message": "success", "sid": self.sid, "data": {"status": status, "result": result}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地讯飞听写替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每条结果前的延迟")
+    parser.add_argument("--final-latency-ms", type=float, default=0.0, help="最终结果前的延迟")
+    parser.add_argument("--connect-latency-ms", type=float, default=0.0, help="握手延迟")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="会话中途返回错误码的概率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="会话中途断开连接的概率")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        final_latency_ms=args.final_latency_ms,
+        connect_latency_ms=args.connect_latency_ms,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+    )
+    server = IatStubServer(config, host=args.host, port=args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""端到端延迟埋点。
+
+各阶段以单调时钟计时，汇总为分位数直方图，可选逐条写入 JSONL 供离线分析。
+未启用时 ``span`` 返回共享的空上下文，``record`` 直接返回，开销可忽略。
+"""
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+
+from loguru import logger
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_tracer", "_stage", "_started")
+
+    def __init__(self, tracer: "LatencyTracer", stage: str) -> None:
+        self._tracer = tracer
+        self._stage = stage
+        self._started = 0.0
+
+    def __enter__(self) -> "_Span":
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._tracer.record(self._stage, time.monotonic() - self._started)
+
+
+class LatencyTracer:
+    """按阶段收集耗时。"""
+
+    def __init__(self) -> None:
+        self._enabled = False
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._sink: Optional[TextIO] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self, jsonl_path: Optional[Path] = None) -> None:
+        """开启埋点；传入路径时每条记录追加写入该 JSONL 文件。"""
+
+        with self._lock:
+            if jsonl_path is not None:
+                jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                self._sink = jsonl_path.open("a", encoding="utf-8", buffering=1)
+            self._enabled = True
+
+    def span(self, stage: str):
+        if not self._enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage: str, seconds: float) -> None:
+        if not self._enabled:
+            return
+        with self._lock:
+            self._samples[stage].append(seconds)
+            if self._sink is not None:
+                self._sink.write(
+                    json.dumps({"ts": time.time(), "stage": stage, "ms": round(seconds * 1000, 3)}) + "\n"
+                )
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """返回各阶段的次数与 p50/p95/p99（毫秒）。"""
+
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items() if values}
+        return {
+            stage: {
+                "count": len(values),
+                "p50": _percentile(values, 50) * 1000,
+                "p95": _percentile(values, 95) * 1000,
+                "p99": _percentile(values, 99) * 1000,
+            }
+            for stage, values in samples.items()
+        }
+
+    def close(self) -> None:
+        """输出汇总并关闭 JSONL 文件。"""
+
+        if not self._enabled:
+            return
+        summary = self.summary()
+        if summary:
+            logger.info("延迟统计（毫秒）:")
+            logger.info("{:<24} {:>6} {:>9} {:>9} {:>9}", "阶段", "次数", "p50", "p95", "p99")
+            for stage in sorted(summary):
+                row = summary[stage]
+                logger.info(
+                    "{:<24} {:>6} {:>9.1f} {:>9.1f} {:>9.1f}",
+                    stage,
+                    int(row["count"]),
+                    row["p50"],
+                    row["p95"],
+                    row["p99"],
+                )
+        with self._lock:
+            self._enabled = False
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    # 最近秩法
+    index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+tracer = LatencyTracer()
@@ -0,0 +1,342 @@
+"""批量转写音频文件。
+
+    python3 -m src.voice_input transcribe recordings/ 'archive/**/*.wav' -o results.jsonl --concurrency 8
+
+WAV 按块流式解码，下混并重采样为 16 kHz 单声道；裸 PCM 需用 ``--pcm-rate`` /
+``--pcm-channels`` 说明格式。讯飞单次会话最长 60 秒，长音频在静音处切段，
+各段并行识别后按顺序拼接。会话数由信号量限制，建连速率由令牌桶限制，
+每个文件完成后立即追加一行 JSONL。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import glob
+import json
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+import websockets
+from loguru import logger
+
+from .async_client import AsyncXFYunIatClient
+from .config import load_credentials
+from .encoders import ENCODERS
+from .longform import stitch
+from .packets import FRAME_BYTES_PER_40MS
+from .resample import TARGET_RATE, StreamingResampler, downmix
+from .speech_client import _XFYUN_URL, XFYunAPIError
+from .vad import SilenceSegmenter
+
+AUDIO_SUFFIXES = (".wav", ".pcm")
+_BYTES_PER_SECOND = TARGET_RATE * 2
+
+
+@dataclass
+class TranscribeConfig:
+    # 同时进行的识别会话数，不应超过账号的并发配额
+    concurrency: int = 4
+    # 每秒新建会话数与突发上限
+    sessions_per_second: float = 5.0
+    burst: int = 4
+    # 单段音频时长上限，需低于讯飞 60 秒的会话上限
+    segment_seconds: float = 55.0
+    # 单段识别失败后的重试次数
+    retries: int = 2
+    # 裸 PCM 文件的格式（16 bit 小端）
+    pcm_rate: int = TARGET_RATE
+    pcm_channels: int = 1
+    # 每次解码的时长
+    decode_block_seconds: float = 1.0
+
+
+class TokenBucket:
+    """asyncio 令牌桶：平均每秒 ``rate`` 个令牌，最多累积 ``burst`` 个。"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._capacity = max(1, burst)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+def find_audio_files(inputs: Iterable[str]) -> List[Path]:
+    """展开目录（递归）与通配符，按出现顺序去重。"""
+
+    found: List[Path] = []
+    seen: Set[Path] = set()
+    for item in inputs:
+        if any(char in item for char in "*?["):
+            candidates = [Path(match) for match in sorted(glob.glob(item, recursive=True))]
+        elif Path(item).is_dir():
+            candidates = sorted(path for path in Path(item).rglob("*") if path.suffix.lower() in AUDIO_SUFFIXES)
+        else:
+            candidates = [Path(item)]
+        for path in candidates:
+            if path.is_file() and path not in seen:
+                seen.add(path)
+                found.append(path)
+    return found
+
+
+def decode_audio(path: Path, config: TranscribeConfig) -> Iterator[np.ndarray]:
+    """逐块解码为 16 kHz 单声道 int16，内存占用与文件长度无关。"""
+
+    if path.suffix.lower() == ".wav":
+        with wave.open(str(path), "rb") as wav:
+            rate, channels, width = wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+            block = max(1, int(rate * config.decode_block_seconds))
+            yield from _convert(iter(lambda: wav.readframes(block), b""), rate, channels, width)
+    else:
+        rate, channels = config.pcm_rate, config.pcm_channels
+        block = max(1, int(rate * config.decode_block_seconds)) * channels * 2
+        with path.open("rb") as handle:
+            yield from _convert(iter(lambda: handle.read(block), b""), rate, channels, 2)
+
+
+def _convert(blocks: Iterable[bytes], rate: int, channels: int, width: int) -> Iterator[np.ndarray]:
+    resampler = StreamingResampler(rate)
+    frame = channels * width
+    remainder = b""
+    for raw in blocks:
+        if remainder:
+            raw = remainder + raw
+        usable = len(raw) - len(raw) % frame
+        raw, remainder = raw[:usable], raw[usable:]
+        samples = _to_int16(raw, width)
+        mono = samples if channels == 1 else downmix(samples.reshape(-1, channels))
+        output = resampler.process(mono)
+        if len(output):
+            yield output
+    tail = resampler.flush()
+    if len(tail):
+        yield tail
+
+
+def _to_int16(raw: bytes, width: int) -> np.ndarray:
+    if width == 2:
+        return np.frombuffer(raw, dtype="<i2")
+    if width == 1:
+        # 8 bit WAV 为无符号
+        return ((np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128) << 8).astype(np.int16)
+    if width == 3:
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)[:, 1:].copy().view("<i2").reshape(-1)
+    if width == 4:
+        return (np.frombuffer(raw, dtype="<i4") >> 16).astype(np.int16)
+    raise ValueError(f"不支持的采样位宽: {width * 8} bit")
+
+
+def _frames(audio: bytes) -> Iterator[memoryview]:
+    view = memoryview(audio)
+    return (view[start : start + FRAME_BYTES_PER_40MS] for start in range(0, len(view), FRAME_BYTES_PER_40MS))
+
+
+class BatchTranscriber:
+    """以受限的并发与建连速率转写多个文件。"""
+
+    def __init__(self, client: AsyncXFYunIatClient, config: Optional[TranscribeConfig] = None) -> None:
+        self._client = client
+        self._config = config or TranscribeConfig()
+        self._sessions: Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[TokenBucket] = None
+
+    async def run(self, paths: List[Path], sink) -> int:
+        """转写全部文件，每完成一个即向 ``sink`` 写入一行 JSON，返回失败的文件数。"""
+
+        config = self._config
+        self._sessions = asyncio.Semaphore(config.concurrency)
+        self._bucket = TokenBucket(config.sessions_per_second, config.burst)
+        pending: asyncio.Queue = asyncio.Queue()
+        for index, path in enumerate(paths, 1):
+            pending.put_nowait((index, path))
+        failures = 0
+
+        async def worker() -> None:
+            nonlocal failures
+            while True:
+                try:
+                    index, path = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await self._transcribe_file(path)
+                sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+                sink.flush()
+                if record["error"]:
+                    failures += 1
+                    logger.error("[{}/{}] {} 失败: {}", index, len(paths), path, record["error"])
+                else:
+                    logger.info(
+                        "[{}/{}] {} 音频 {:.1f}s，耗时 {:.1f}s",
+                        index,
+                        len(paths),
+                        path,
+                        record["audio_seconds"],
+                        record["elapsed"],
+                    )
+
+        await asyncio.gather(*(worker() for _ in range(min(config.concurrency, len(paths)) or 1)))
+        return failures
+
+    async def _transcribe_file(self, path: Path) -> dict:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        segmenter = SilenceSegmenter(max_seconds=self._config.segment_seconds)
+        tasks: List[asyncio.Task] = []
+        pauses: List[Optional[float]] = []
+        text = ""
+        audio_bytes = 0
+        error: Optional[str] = None
+        # 解码、重采样与切段放到专用线程，避免阻塞其他会话的收发；
+        # 生成器的迭代与关闭都在这一个线程上依次执行，不会在 next() 运行时关闭它
+        segments = segmenter.stream(decode_audio(path, self._config))
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcribe-decode")
+        # 限制单个文件同时在内存中等待识别的段数
+        window = asyncio.Semaphore(self._config.concurrency)
+        try:
+            while True:
+                await window.acquire()
+                segment = await loop.run_in_executor(reader, next, segments, None)
+                if segment is None:
+                    break
+                audio_bytes += len(segment.audio)
+                pauses.append(segment.pause_after_millis)
+                task = asyncio.create_task(self._recognize(segment.audio))
+                task.add_done_callback(lambda _: window.release())
+                tasks.append(task)
+            text = stitch(await asyncio.gather(*tasks), pauses)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        finally:
+            for task in tasks:
+                task.cancel()
+            # 取消或出错时 next() 可能仍在线程中运行，关闭排在它之后
+            await loop.run_in_executor(reader, segments.close)
+            reader.shutdown(wait=False)
+
+        elapsed = time.monotonic() - started
+        audio_seconds = audio_bytes / _BYTES_PER_SECOND
+        return {
+            "file": str(path),
+            "text": text,
+            "audio_seconds": round(audio_seconds, 3),
+            "segments": len(tasks),
+            "elapsed": round(elapsed, 3),
+            "rtf": round(elapsed / audio_seconds, 4) if audio_seconds else None,
+            "error": error,
+            "ts": time.time(),
+        }
+
+    async def _recognize(self, segment: bytes) -> str:
+        for attempt in range(1, self._config.retries + 1):
+            try:
+                return await self._recognize_once(segment)
+            except (XFYunAPIError, OSError, websockets.WebSocketException) as exc:
+                logger.warning("识别失败，第 {} 次重试: {}", attempt, exc)
+            await asyncio.sleep(min(2.0 ** attempt, 10.0))
+        # 最后一次失败直接抛出
+        return await self._recognize_once(segment)
+
+    async def _recognize_once(self, segment: bytes) -> str:
+        assert self._sessions is not None and self._bucket is not None
+        async with self._sessions:
+            await self._bucket.acquire()
+            return await self._client.recognize_async(_frames(segment))
+
+
+def _completed_files(output: Path) -> Set[str]:
+    done: Set[str] = set()
+    if not output.exists():
+        return done
+    with output.open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not record.get("error"):
+                done.add(record.get("file"))
+    return done
+
+
+def _parse_args(argv: Optional[Iterable[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="voice_input transcribe", description="批量转写音频文件")
+    parser.add_argument("inputs", nargs="+", help="WAV/PCM 文件、目录或通配符（支持 **）")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="结果 JSONL，逐文件追加写入")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的识别会话数")
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒最多新建的会话数")
+    parser.add_argument("--burst", type=int, default=None, help="令牌桶容量，默认等于 --concurrency")
+    parser.add_argument("--retries", type=int, default=2, help="单段识别失败后的重试次数")
+    parser.add_argument("--segment-seconds", type=float, default=55.0, help="长音频在静音处切段，单段时长上限")
+    parser.add_argument("--pcm-rate", type=int, default=TARGET_RATE, help="裸 PCM 的采样率")
+    parser.add_argument("--pcm-channels", type=int, default=1, help="裸 PCM 的声道数")
+    parser.add_argument("--audio-encoding", choices=sorted(ENCODERS), default="raw", help="上传前的压缩方式")
+    parser.add_argument("--realtime-factor", type=float, default=None, help="发送速度相对实时的倍数，默认不限速")
+    parser.add_argument("--skip-done", action="store_true", help="跳过输出文件中已成功转写的文件")
+    parser.add_argument("--url", default=_XFYUN_URL, help="听写服务地址，可指向本地替身服务")
+    parser.add_argument("--verbose", action="store_true", help="输出逐包调试日志")
+    return parser.parse_args(None if argv is None else list(argv))
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    args = _parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if args.verbose else "INFO")
+
+    paths = find_audio_files(args.inputs)
+    output = Path(args.output)
+    if args.skip_done:
+        done = _completed_files(output)
+        paths = [path for path in paths if str(path) not in done]
+    if not paths:
+        logger.warning("没有需要转写的文件")
+        return 0
+
+    try:
+        client = AsyncXFYunIatClient(
+            load_credentials(),
+            realtime_factor=args.realtime_factor,
+            audio_encoding=args.audio_encoding,
+            url=args.url,
+        )
+    except Exception as exc:
+        logger.error("启动失败: {}", exc)
+        return 2
+    config = TranscribeConfig(
+        concurrency=args.concurrency,
+        sessions_per_second=args.rate,
+        burst=args.burst or args.concurrency,
+        segment_seconds=args.segment_seconds,
+        retries=args.retries,
+        pcm_rate=args.pcm_rate,
+        pcm_channels=args.pcm_channels,
+    )
+    logger.info("共 {} 个文件，并发 {}，结果写入 {}", len(paths), config.concurrency, output)
+
+    started = time.monotonic()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("a", encoding="utf-8") as sink:
+        failures = asyncio.run(BatchTranscriber(client, config).run(paths, sink))
+    logger.info("完成 {} 个文件，失败 {} 个，总耗时 {:.1f}s", len(paths), failures, time.monotonic() - started)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
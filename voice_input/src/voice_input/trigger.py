@@ -0,0 +1,66 @@
+"""向常驻的语音输入助手发送控制命令。
+
+只依赖标准库，启动开销接近解释器本身，适合绑定到启动器或快捷指令：
+
+    python3 -m src.voice_input.trigger toggle
+    printf 'toggle\\n' | nc -U "$(python3 -m src.voice_input.trigger --print-socket)"
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+COMMANDS = ("toggle", "start", "stop", "status", "ping")
+
+
+def default_socket_path() -> Path:
+    """``$XDG_RUNTIME_DIR/voice_input.sock``，没有该变量时放在临时目录并带上用户 ID。"""
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "voice_input.sock"
+    return Path(tempfile.gettempdir()) / f"voice_input-{os.getuid()}.sock"
+
+
+def send_command(command: str, path: Optional[Path] = None, *, timeout: float = 2.0) -> str:
+    """发送一条命令并返回应答行，如 ``ok recording``。"""
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path or default_socket_path()))
+        sock.sendall(command.encode("utf-8") + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            data = sock.recv(256)
+            if not data:
+                break
+            reply += data
+    return reply.decode("utf-8").strip()
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="voice_input trigger", description="控制常驻的语音输入助手")
+    parser.add_argument("command", nargs="?", default="toggle", choices=COMMANDS)
+    parser.add_argument("--socket", help="控制 socket 路径")
+    parser.add_argument("--print-socket", action="store_true", help="输出默认 socket 路径后退出")
+    args = parser.parse_args(None if argv is None else list(argv))
+
+    if args.print_socket:
+        print(default_socket_path())
+        return 0
+    try:
+        reply = send_command(args.command, Path(args.socket) if args.socket else None)
+    except OSError as exc:
+        print(f"无法连接语音输入助手（是否已用 daemon 模式启动？）: {exc}", file=sys.stderr)
+        return 2
+    print(reply)
+    return 0 if reply.startswith("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""语音片段识别队列。"""
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .telemetry import tracer
+
+RecognitionJob = Callable[[], Optional[str]]
+
+
+@dataclass(frozen=True)
+class UtteranceQueueStats:
+    depth: int
+    in_flight: int
+    completed: int
+    rejected: int
+    last_wait: float
+    max_wait: float
+
+
+class UtteranceQueue:
+    """有界的识别队列：工作线程并发识别，结果按录音顺序交付。
+
+    每段录音提交时分配递增序号，识别完成后暂存于重排缓冲区，
+    只有前面的片段都交付后才会交付当前片段。
+    """
+
+    def __init__(self, deliver: Callable[[str], None], *, workers: int = 2, maxsize: int = 8) -> None:
+        self._deliver = deliver
+        self._jobs: "queue.Queue[Optional[Tuple[int, RecognitionJob, float]]]" = queue.Queue(maxsize)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._deliver_lock = threading.Lock()
+        # 序号 -> (识别文本, 入队时间)
+        self._ready: Dict[int, Tuple[Optional[str], float]] = {}
+        self._next_to_deliver = 0
+        self._in_flight = 0
+        # 已提交但尚未识别完成的片段数
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._last_wait = 0.0
+        self._max_wait = 0.0
+        self._workers: List[threading.Thread] = [
+            threading.Thread(target=self._work, name=f"recognizer-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, job: RecognitionJob) -> bool:
+        """提交一段录音的识别任务；队列已满时返回 False。"""
+
+        with self._lock:
+            sequence = next(self._sequence)
+            try:
+                self._jobs.put_nowait((sequence, job, time.monotonic()))
+            except queue.Full:
+                self._rejected += 1
+                # 被拒绝的序号记为空结果，避免阻塞后续片段的交付
+                self._ready[sequence] = (None, time.monotonic())
+                rejected = True
+            else:
+                rejected = False
+                self._pending += 1
+        if rejected:
+            self._flush()
+            return False
+        depth = self._jobs.qsize()
+        if depth > 1:
+            logger.info("识别队列积压 {} 段，最近排队等待 {:.2f}s", depth, self._last_wait)
+        return True
+
+    def depth(self) -> int:
+        return self._jobs.qsize()
+
+    def idle(self) -> bool:
+        """没有排队、识别中或待交付的片段。"""
+
+        with self._lock:
+            return self._pending == 0 and not self._ready
+
+    def stats(self) -> UtteranceQueueStats:
+        with self._lock:
+            return UtteranceQueueStats(
+                depth=self._jobs.qsize(),
+                in_flight=self._in_flight,
+                completed=self._completed,
+                rejected=self._rejected,
+                last_wait=self._last_wait,
+                max_wait=self._max_wait,
+            )
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        for _ in self._workers:
+            self._jobs.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                return
+            sequence, job, enqueued_at = item
+            wait = time.monotonic() - enqueued_at
+            tracer.record("queue.wait", wait)
+            with self._lock:
+                self._in_flight += 1
+                self._last_wait = wait
+                self._max_wait = max(self._max_wait, wait)
+
+            text: Optional[str] = None
+            try:
+                text = job()
+            except Exception as exc:  # pragma: no cover - 单段失败不影响其他片段
+                logger.exception("识别任务失败: {}", exc)
+
+            with self._lock:
+                self._in_flight -= 1
+                self._pending -= 1
+                self._completed += 1
+                self._ready[sequence] = (text, enqueued_at)
+            self._flush()
+
+    def _flush(self) -> None:
+        # 串行交付，保证顺序且不与其他交付交错
+        with self._deliver_lock:
+            while True:
+                with self._lock:
+                    if self._next_to_deliver not in self._ready:
+                        return
+                    text, enqueued_at = self._ready.pop(self._next_to_deliver)
+                    self._next_to_deliver += 1
+                if text:
+                    try:
+                        self._deliver(text)
+                    except Exception as exc:  # pragma: no cover
+                        logger.exception("交付识别结果失败: {}", exc)
+                    else:
+                        # 入队时刻即结束录音时刻
+                        tracer.record("utterance.total", time.monotonic() - enqueued_at)
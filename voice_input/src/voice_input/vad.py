@@ -0,0 +1,207 @@
+"""基于短时能量与过零率的静音裁剪与长音频切段。"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+# 逐帧特征每次处理的帧数
+_FEATURE_BLOCK_FRAMES = 4096
+
+
+@dataclass
+class VadConfig:
+    frame_millis: int = 20
+    # 语音能量阈值 = max(min_rms, 噪声底 * energy_ratio)
+    energy_ratio: float = 3.0
+    min_rms: float = 150.0
+    # 清辅音能量低但过零率高，能量达到阈值一半且过零率超过该值也视为语音
+    zcr_threshold: float = 0.3
+    hangover_millis: int = 300
+    padding_millis: int = 150
+    # 设置后，句中超过该时长的停顿会被压缩到 keep_pause_millis
+    max_pause_millis: Optional[int] = None
+    keep_pause_millis: int = 400
+
+
+class VoiceActivityTrimmer:
+    """裁剪首尾静音，可选压缩句中长停顿。"""
+
+    def __init__(self, config: Optional[VadConfig] = None, *, samplerate: int = 16000) -> None:
+        self._config = config or VadConfig()
+        self._samplerate = samplerate
+        self._frame_len = max(1, samplerate * self._config.frame_millis // 1000)
+
+    def speech_mask(self, samples: np.ndarray) -> np.ndarray:
+        """逐帧判定是否为语音（已包含拖尾与前置填充）。"""
+
+        config = self._config
+        frame_len = self._frame_len
+        count = len(samples) // frame_len
+        if count == 0:
+            return np.zeros(0, dtype=bool)
+        frames = samples[: count * frame_len].reshape(count, frame_len)
+
+        # 分块计算逐帧特征，临时数组大小与录音时长无关（长录音可能是 mmap 上的视图）
+        rms = np.empty(count)
+        zcr = np.empty(count)
+        for start in range(0, count, _FEATURE_BLOCK_FRAMES):
+            block = frames[start : start + _FEATURE_BLOCK_FRAMES]
+            energy = np.einsum("ij,ij->i", block, block, dtype=np.int64)
+            rms[start : start + len(block)] = np.sqrt(energy / frame_len)
+            signs = block >= 0
+            zcr[start : start + len(block)] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+
+        noise_floor = float(np.percentile(rms, 10))
+        threshold = max(config.min_rms, noise_floor * config.energy_ratio)
+        active = (rms >= threshold) | ((rms >= threshold / 2) & (zcr >= config.zcr_threshold))
+
+        hangover = self._frames(config.hangover_millis)
+        padding = self._frames(config.padding_millis)
+        if hangover or padding:
+            # 向后延伸 hangover 帧、向前延伸 padding 帧
+            kernel = np.ones(hangover + padding + 1, dtype=np.int32)
+            spread = np.convolve(active.astype(np.int32), kernel, mode="full")
+            active = spread[padding : padding + count] > 0
+        return active
+
+    def trim(self, audio: Union[bytes, memoryview]) -> memoryview:
+        """返回裁剪后的 PCM；仅裁剪首尾时为零拷贝视图，未检测到语音时返回空。"""
+
+        samples = np.frombuffer(audio, dtype=np.int16)
+        mask = self.speech_mask(samples)
+        indices = np.flatnonzero(mask)
+        if len(indices) == 0:
+            logger.info("未检测到语音活动")
+            return memoryview(b"")
+
+        frame_len = self._frame_len
+        first, last = int(indices[0]), int(indices[-1])
+        end = len(samples) if last == len(mask) - 1 else (last + 1) * frame_len
+        trimmed = samples[first * frame_len : end]
+
+        max_pause = self._config.max_pause_millis
+        if max_pause is not None:
+            trimmed = self._collapse_pauses(trimmed, mask[first : last + 1], self._frames(max_pause))
+
+        logger.debug(
+            "静音裁剪: {:.2f}s -> {:.2f}s",
+            len(samples) / self._samplerate,
+            len(trimmed) / self._samplerate,
+        )
+        return memoryview(trimmed.view(np.uint8))
+
+    def _collapse_pauses(self, samples: np.ndarray, mask: np.ndarray, max_pause: int) -> np.ndarray:
+        keep_pause = min(self._frames(self._config.keep_pause_millis), max_pause)
+        # 找出所有静音段的起止帧
+        edges = np.diff(np.concatenate(([1], mask.astype(np.int8), [1])))
+        starts = np.flatnonzero(edges == -1)
+        ends = np.flatnonzero(edges == 1)
+        long_pauses = (ends - starts) > max_pause
+        if not long_pauses.any():
+            return samples
+
+        keep = np.ones(len(samples), dtype=bool)
+        frame_len = self._frame_len
+        for start, end in zip(starts[long_pauses], ends[long_pauses]):
+            # 保留停顿两端各一半，切掉中间部分
+            head = keep_pause // 2
+            tail = keep_pause - head
+            keep[(start + head) * frame_len : (end - tail) * frame_len] = False
+        return samples[keep]
+
+    def _frames(self, millis: int) -> int:
+        return int(millis * self._samplerate / 1000) // self._frame_len
+
+
+@dataclass
+class Segment:
+    # split 得到的是输入的零拷贝视图，stream 得到的是独立的 bytes
+    audio: Union[bytes, memoryview]
+    start_seconds: float
+    # 与下一段之间的静音时长（VAD 判定、不含拖尾与填充）；0 表示在语音中强行切断，最后一段为 None
+    pause_after_millis: Optional[float] = None
+
+
+class SilenceSegmenter:
+    """把长音频在静音处切成不超过 ``max_seconds`` 的段，适配讯飞单次会话 60 秒的上限。
+
+    每次在 ``[min_seconds, max_seconds]`` 范围内取最长的静音段，从其中点切开；
+    范围内没有静音时退而在能量最低的帧处切断。
+    """
+
+    def __init__(
+        self,
+        *,
+        max_seconds: float = 55.0,
+        min_seconds: float = 20.0,
+        config: Optional[VadConfig] = None,
+        samplerate: int = 16000,
+    ) -> None:
+        self._vad = VoiceActivityTrimmer(config, samplerate=samplerate)
+        self._samplerate = samplerate
+        self._max_samples = int(max_seconds * samplerate)
+        self._min_samples = int(min(min_seconds, max_seconds) * samplerate)
+        if self._max_samples < 2 * self._vad._frame_len:
+            raise ValueError(f"max_seconds 过短，至少需要两帧: {max_seconds}")
+
+    def split(self, audio: Union[bytes, memoryview]) -> List[Segment]:
+        """切分整段音频，各段为 ``audio`` 的零拷贝视图，切点与 :meth:`stream` 相同。"""
+
+        view = memoryview(audio)
+        if view.format != "B" or view.ndim != 1:
+            view = view.cast("B")
+        samples = np.frombuffer(view, dtype=np.int16)
+        segments: List[Segment] = []
+        offset = 0
+        while len(samples) - offset > self._max_samples:
+            cut, pause = self._choose_cut(samples[offset : offset + self._max_samples])
+            segments.append(Segment(view[offset * 2 : (offset + cut) * 2], offset / self._samplerate, pause))
+            offset += cut
+        if offset < len(samples):
+            segments.append(Segment(view[offset * 2 :], offset / self._samplerate))
+        return segments
+
+    def stream(self, blocks: Iterable[np.ndarray]) -> Iterator[Segment]:
+        """逐块输入 16 bit PCM，缓冲超过上限时立即产出一段，缓冲不超过一段加一块。"""
+
+        pending = bytearray()
+        offset = 0
+        max_bytes = self._max_samples * 2
+        for block in blocks:
+            pending += block.tobytes()
+            while len(pending) > max_bytes:
+                cut, pause = self._choose_cut(np.frombuffer(pending, dtype=np.int16, count=self._max_samples))
+                yield Segment(bytes(pending[: cut * 2]), offset / self._samplerate, pause)
+                del pending[: cut * 2]
+                offset += cut
+        if pending:
+            yield Segment(bytes(pending), offset / self._samplerate)
+
+    def _choose_cut(self, window: np.ndarray) -> tuple[int, float]:
+        vad = self._vad
+        frame_len = vad._frame_len
+        frame_millis = frame_len * 1000 / self._samplerate
+        mask = vad.speech_mask(window)
+        # 至少保留一帧，否则 min_seconds 为 0 时可能在 0 处切开而无法前进
+        lowest = min(max(self._min_samples // frame_len, 1), len(mask) - 1)
+
+        edges = np.diff(np.concatenate(([1], mask.astype(np.int8), [1])))
+        starts = np.flatnonzero(edges == -1)
+        ends = np.flatnonzero(edges == 1)
+        usable = ends > lowest
+        if usable.any():
+            starts, ends = starts[usable], ends[usable]
+            lengths = ends - np.maximum(starts, lowest)
+            # 同样长时取靠后的静音，让本段尽量长
+            best = len(lengths) - 1 - int(np.argmax(lengths[::-1]))
+            middle = (max(int(starts[best]), lowest) + int(ends[best])) // 2
+            return middle * frame_len, float(ends[best] - starts[best]) * frame_millis
+
+        frames = window[: len(mask) * frame_len].reshape(len(mask), frame_len)[lowest:]
+        energy = np.einsum("ij,ij->i", frames, frames, dtype=np.int64)
+        quietest = lowest + int(np.argmin(energy))
+        logger.debug("切段范围内没有静音，在第 {:.1f}s 处强行切断", quietest * frame_millis / 1000)
+        return quietest * frame_len, 0.0